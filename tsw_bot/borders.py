@@ -0,0 +1,72 @@
+"""Row colour detection and run segmentation for the list widgets.
+
+Train boxes have a #dedede left border, service boxes a
+SERVICE_BOX_BORDER_RGB one, and the schedule is made of box-coloured
+rows and #132c39 separators. Finding them comes down to the same steps,
+done here on uint8 frames without widening copies:
+
+    color_mask(img, rgb, tol)                    pixels within tol of rgb
+    rows_with_color(img, rgb, tol, columns, ...) rows where the colour shows
+    runs(rows, min_length)                       (start, end) of each run of rows
+
+Each function takes one frame (H, W, 3) or a batch of equally sized
+frames (N, H, W, 3), such as every grab of a scroll, and works over the
+last axes; runs() returns one list per frame for a batch.
+"""
+import cv2
+import numpy as np
+
+
+def color_mask(img, rgb, tol):
+    """Return a bool mask (..., H, W) of the pixels within `tol` of `rgb` in every channel."""
+    rgb = np.asarray(rgb, dtype=int)
+    lower = np.clip(rgb - tol, 0, 255).astype(np.uint8)
+    upper = np.clip(rgb + tol, 0, 255).astype(np.uint8)
+    width = img.shape[-2]
+    if img.size == 0:
+        return np.zeros(img.shape[:-1], dtype=bool)
+    # cv2.inRange wants a single image: stack a batch's rows on top of each other
+    mask = cv2.inRange(img.reshape(-1, width, 3), lower, upper)
+    return mask.reshape(img.shape[:-1]) != 0
+
+
+def rows_with_color(img, rgb, tol, columns=slice(None), min_share=None):
+    """Return a bool array (..., H): rows where the colour shows in `columns`.
+
+    By default one matching pixel is enough; with `min_share`, more than
+    that share of the columns must match.
+    """
+    mask = color_mask(img[..., columns, :], rgb, tol)
+    if min_share is None:
+        return np.any(mask, axis=-1)
+    return np.count_nonzero(mask, axis=-1) > min_share * mask.shape[-1]
+
+
+def runs(rows, min_length=1):
+    """Return the (start, end) ranges (end exclusive) of each run of True rows.
+
+    Runs shorter than `min_length` are dropped. `rows` is a bool array
+    (H,), or (N, H) for a batch, which gives a list of runs per frame.
+    """
+    rows = np.asarray(rows, dtype=bool)
+    if rows.size == 0:
+        # An empty crop (e.g. a region at the screen edge) has no runs
+        return [[] for _ in range(rows.shape[0])] if rows.ndim > 1 else []
+    batch = rows.reshape(-1, rows.shape[-1])
+    # Every frame starts and ends outside a run, so its edges come in pairs
+    padded = np.pad(batch, ((0, 0), (1, 1))).astype(np.int8)
+    frames, edges = np.nonzero(np.diff(padded, axis=-1))
+    starts, ends, frames = edges[::2], edges[1::2], frames[::2]
+    keep = ends - starts >= min_length
+
+    found = [[] for _ in range(batch.shape[0])]
+    for frame, start, end in zip(frames[keep].tolist(), starts[keep].tolist(),
+                                 ends[keep].tolist()):
+        found[frame].append((start, end))
+    return found if rows.ndim > 1 else found[0]
+
+
+def segment(img, rgb, tol, columns=slice(None), min_length=1):
+    """Return the runs of rows (at least `min_length` long) where the colour
+    shows in `columns` — the boxes of a list, found by their border."""
+    return runs(rows_with_color(img, rgb, tol, columns), min_length)
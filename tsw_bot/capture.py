@@ -0,0 +1,178 @@
+"""Shared screen capture.
+
+A background thread grabs the desktop into a timestamped latest-frame buffer.
+Waits, matchers and region crops all read from that buffer, so one grab serves
+every consumer instead of each one taking its own full-desktop screenshot.
+
+Frames are uint8 RGB numpy arrays in screen coordinates, produced by a
+backend from capture_backends.py. A stored frame is never modified, so
+callers may hold views into it — but copy a crop if you keep it around for
+long, otherwise the whole desktop frame stays alive with it.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+import health
+from capture_backends import get_backend
+
+
+class FrameGrabber(threading.Thread):
+    """Background thread that keeps the latest desktop frame in a buffer.
+
+    Grabs on demand: a consumer asking for a frame newer than the buffer
+    wakes the thread, and every consumer waiting at that moment is served
+    by the same grab.
+    """
+
+    def __init__(self, backend):
+        super().__init__(name="FrameGrabber", daemon=True)
+        self.backend = backend
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._error = None
+        self._pending = False
+        self._stopped = False
+        self.grabs = 0
+        self.reads = 0
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    self.backend.close()
+                    return
+                self._pending = False
+
+            started = time.time()
+            try:
+                frame = self.backend.grab()
+                error = None
+            except Exception as e:  # surface grab failures to the waiting consumer
+                frame = None
+                error = e
+
+            if error is None:
+                health.monitor.record_grab(time.time() - started)
+
+            with self._cond:
+                if error is None:
+                    self._frame = frame
+                    self._timestamp = started
+                    self.grabs += 1
+                self._error = error
+                self._cond.notify_all()
+
+    def request(self):
+        """Ask for a new grab without waiting for it."""
+        with self._cond:
+            self._pending = True
+            self._cond.notify_all()
+
+    def get(self, since, timeout=config.CAPTURE_TIMEOUT):
+        """Return (frame, timestamp) for a frame grabbed at or after `since`."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._frame is None or self._timestamp < since:
+                self._pending = True
+                self._cond.notify_all()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a screen capture")
+                self._cond.wait(timeout=remaining)
+                if self._error is not None:
+                    error, self._error = self._error, None
+                    raise error
+            self.reads += 1
+            return self._frame, self._timestamp
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
+_grabber = None
+_grabber_lock = threading.Lock()
+
+
+def start(backend=None):
+    """Start the background grabber (no-op if it is already running).
+
+    `backend` is a CaptureBackend instance or name; defaults to
+    config.CAPTURE_BACKEND.
+    """
+    global _grabber
+    with _grabber_lock:
+        if _grabber is None or not _grabber.is_alive():
+            if backend is None or isinstance(backend, str):
+                backend = get_backend(backend)
+            _grabber = FrameGrabber(backend)
+            _grabber.start()
+        return _grabber
+
+
+def stop():
+    """Stop the background grabber."""
+    global _grabber
+    with _grabber_lock:
+        if _grabber is not None:
+            _grabber.stop()
+            _grabber = None
+
+
+def get_frame(since=None, max_age=config.CAPTURE_MAX_AGE):
+    """Return (frame, timestamp) from the shared buffer.
+
+    By default a buffered frame up to `max_age` seconds old is reused.
+    Pass `since=time.time()` after an action to force a frame that shows
+    its result.
+    """
+    if since is None:
+        since = time.time() - max_age
+    return start().get(since)
+
+
+def get_region(region, since=None, max_age=config.CAPTURE_MAX_AGE):
+    """Return an RGB view of a (left, top, width, height) screen region.
+
+    The view shares memory with the buffered desktop frame (no copy).
+    """
+    left, top, width, height = region
+    frame, _ = get_frame(since=since, max_age=max_age)
+    return frame[top:top + height, left:left + width, :]
+
+
+def grab_region(region):
+    """Grab just a (left, top, width, height) region straight from the backend.
+
+    Bypasses the shared buffer — for watching a small area at high frequency,
+    where a full-desktop grab per check would be wasteful.
+    """
+    return start().backend.grab(region)
+
+
+def stats():
+    """Return grab/read counters for the running grabber."""
+    grabber = _grabber
+    if grabber is None:
+        return {"grabs": 0, "reads": 0}
+    return {"grabs": grabber.grabs, "reads": grabber.reads}
+
+
+def frame_signature(frame, step=config.CHANGE_GATE_STEP):
+    """Return a cheap signature of a frame: every `step`-th pixel on a grid."""
+    return np.ascontiguousarray(frame[::step, ::step])
+
+
+def signatures_differ(a, b, tolerance=config.CHANGE_GATE_TOLERANCE):
+    """True if any sampled pixel differs by more than `tolerance` in any channel."""
+    if a is None or b is None or a.shape != b.shape:
+        return True
+    return bool(np.any(cv2.absdiff(a, b) > tolerance))
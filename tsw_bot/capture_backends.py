@@ -0,0 +1,230 @@
+"""Pluggable screen-capture backends.
+
+Every backend returns frames as C-contiguous uint8 RGB numpy arrays in
+screen coordinates, with at most one copy from the native grab buffer:
+
+    pyautogui  PIL screenshot, wrapped with np.asarray (no second copy)
+    mss        native grab (BitBlt on Windows), BGRA buffer converted once
+    file       frames from image files, for testing without the game
+
+Run a benchmark of the available backends with:
+    python capture_backends.py [--seconds N] [backend ...]
+"""
+import argparse
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import config
+
+
+class CaptureBackend:
+    """Base class: grab the desktop, or a (left, top, width, height) region of it."""
+
+    name = "base"
+
+    def grab(self, region=None):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PyAutoGuiBackend(CaptureBackend):
+    """Grab through pyautogui.screenshot (what the bot has always used)."""
+
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui  # imported lazily so the file backend works without a display
+        self._pyautogui = pyautogui
+
+    def grab(self, region=None):
+        return np.asarray(self._pyautogui.screenshot(region=region))
+
+
+class MssBackend(CaptureBackend):
+    """Grab with the native mss library, skipping the PIL round-trip.
+
+    mss handles are not shareable between threads, so each thread that
+    grabs gets its own.
+    """
+
+    name = "mss"
+
+    def __init__(self):
+        import mss  # optional dependency
+        self._mss = mss
+        self._local = threading.local()
+
+    def _handle(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is None:
+            sct = self._mss.mss()
+            self._local.sct = sct
+        return sct
+
+    def grab(self, region=None):
+        sct = self._handle()
+        if region is None:
+            monitor = sct.monitors[1]  # primary monitor, same as pyautogui
+        else:
+            left, top, width, height = region
+            monitor = {"left": left, "top": top, "width": width, "height": height}
+        shot = sct.grab(monitor)
+        bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return cv2.cvtColor(bgra, cv2.COLOR_BGRA2RGB)
+
+    def close(self):
+        sct = getattr(self._local, "sct", None)
+        if sct is not None:
+            sct.close()
+            self._local.sct = None
+
+
+class FileBackend(CaptureBackend):
+    """Serve frames from image files instead of the screen.
+
+    `source` is an image file or a directory of PNGs (played back in name
+    order, one per full-desktop grab, holding on the last). Frames can also
+    be passed directly or swapped in with set_frame(). With no source at
+    all, a black 3840x2160 desktop is served.
+    """
+
+    name = "file"
+
+    def __init__(self, source=None, frames=None):
+        if frames is None:
+            source = source or config.CAPTURE_FILE_SOURCE
+            frames = self._load(source) if source else [np.zeros((2160, 3840, 3), np.uint8)]
+        self._frames = [self._freeze(f) for f in frames]
+        self._index = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(source):
+        if os.path.isdir(source):
+            paths = [os.path.join(source, f) for f in sorted(os.listdir(source))
+                     if f.lower().endswith(".png")]
+        else:
+            paths = [source]
+        frames = []
+        for path in paths:
+            bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise FileNotFoundError(f"Could not read capture frame: {path}")
+            frames.append(cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+        if not frames:
+            raise FileNotFoundError(f"No PNG frames found in: {source}")
+        return frames
+
+    @staticmethod
+    def _freeze(frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        frame.flags.writeable = False
+        return frame
+
+    def set_frame(self, frame):
+        """Replace the playback list with a single frame."""
+        with self._lock:
+            self._frames = [self._freeze(frame)]
+            self._index = 0
+
+    def grab(self, region=None):
+        with self._lock:
+            frame = self._frames[self._index]
+            if region is None:
+                self._index = min(self._index + 1, len(self._frames) - 1)
+                return frame
+        left, top, width, height = region
+        return np.ascontiguousarray(frame[top:top + height, left:left + width, :])
+
+
+BACKENDS = {
+    "pyautogui": PyAutoGuiBackend,
+    "mss": MssBackend,
+    "file": FileBackend,
+}
+
+
+def get_backend(name=None):
+    """Create a backend by name. 'auto' prefers mss and falls back to pyautogui."""
+    name = name or config.CAPTURE_BACKEND
+    if name == "auto":
+        try:
+            return MssBackend()
+        except ImportError:
+            return PyAutoGuiBackend()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown capture backend '{name}' "
+                         f"(expected one of: auto, {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+
+def _bench_regions():
+    """Regions the bot grabs most often, keyed by a short label."""
+    return {
+        "service_list": (config.SERVICE_LIST_LEFT, config.SERVICE_LIST_TOP,
+                         config.SERVICE_LIST_RIGHT - config.SERVICE_LIST_LEFT,
+                         config.SERVICE_LIST_BOTTOM - config.SERVICE_LIST_TOP),
+        "schedule": (config.SCHEDULE_LEFT, config.SCHEDULE_TOP,
+                     config.SCHEDULE_RIGHT - config.SCHEDULE_LEFT,
+                     config.SCHEDULE_BOTTOM - config.SCHEDULE_TOP),
+        "train_box": (config.TRAIN_BOX_LEFT, config.TRAIN_BOX_TOP,
+                      config.TRAIN_BOX_WIDTH, config.TRAIN_BOX_HEIGHT),
+    }
+
+
+def benchmark(backend, seconds=3.0):
+    """Measure full-frame FPS and per-region grab latency for one backend.
+
+    Returns a dict: {"fps": float, "regions": {label: (mean_ms, p95_ms)}}.
+    """
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        backend.grab()
+        frames += 1
+    fps = frames / (time.perf_counter() - start)
+
+    regions = {}
+    for label, region in _bench_regions().items():
+        timings = []
+        region_start = time.perf_counter()
+        while time.perf_counter() - region_start < seconds / 3:
+            t0 = time.perf_counter()
+            backend.grab(region)
+            timings.append((time.perf_counter() - t0) * 1000)
+        regions[label] = (float(np.mean(timings)), float(np.percentile(timings, 95)))
+    return {"fps": fps, "regions": regions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark screen-capture backends.")
+    parser.add_argument("backends", nargs="*", default=list(BACKENDS),
+                        help="backends to test (default: all)")
+    parser.add_argument("--seconds", type=float, default=3.0,
+                        help="time spent on full-frame grabs per backend")
+    args = parser.parse_args()
+
+    print("=== Capture backend benchmark ===\n")
+    for name in args.backends:
+        try:
+            backend = get_backend(name)
+        except Exception as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+        try:
+            result = benchmark(backend, seconds=args.seconds)
+        finally:
+            backend.close()
+        print(f"{name:<10} full frame: {result['fps']:.1f} fps")
+        for label, (mean_ms, p95_ms) in result["regions"].items():
+            print(f"{'':<10} {label:<13} mean {mean_ms:6.1f} ms   p95 {p95_ms:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
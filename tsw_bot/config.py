@@ -4,18 +4,54 @@ import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 REFERENCES_DIR = os.path.join(BASE_DIR, "references")
 SCREENSHOTS_DIR = os.path.join(BASE_DIR, "screenshots")
+STATE_DIR = os.path.join(BASE_DIR, "state")   # caches the bot learns between runs
 
 # Steam
 STEAM_APP_ID = "3656800"
+GAME_PROCESS_NAME = "TS2Prototype-Win64-Shipping.exe"   # the game's process (for health.py)
 
 # Timeouts (seconds)
 GAME_LAUNCH_TIMEOUT = 120   # TSW takes a while to start
 SCREEN_TIMEOUT = 60         # waiting for a menu screen to appear
-CLICK_SETTLE_DELAY = 2.0    # pause after clicking before looking for next screen
+CLICK_SETTLE_DELAY = 2.0    # max wait after clicking for the UI to settle
+
+# Screen capture (shared background grabber — see capture.py)
+CAPTURE_BACKEND = "auto"    # "auto" (mss if installed), "mss", "pyautogui" or "file"
+CAPTURE_FILE_SOURCE = None  # image file or folder of PNGs served by the "file" backend
+CAPTURE_MAX_AGE = 0.5       # reuse a buffered frame if it is at most this old (seconds)
+CAPTURE_TIMEOUT = 10.0      # give up waiting for the grabber after this long
+CHANGE_GATE_STEP = 8        # frame signature samples every Nth pixel on a grid
+CHANGE_GATE_TOLERANCE = 16  # per-channel difference that counts as a changed sample
+
+# Early-exit frame comparison (see frame_compare.py)
+COMPARE_FIRST_ROWS = 16     # rows in the first chunk compared (each chunk doubles)
+COMPARE_MIN_ROWS = 32       # rows compared before an early decision is allowed
+COMPARE_Z = 4.0             # standard errors between difference and threshold to stop early
+
+# "Wait until UI is stable" (utils.wait_until_stable) — replaces fixed post-action sleeps
+SETTLE_FRAMES = 3           # consecutive identical captures that count as settled
+SETTLE_INTERVAL = 0.15      # seconds between settle captures
 
 # Image matching confidence thresholds
 CONFIDENCE = 0.8            # default for menu tiles
 CONFIDENCE_LOW = 0.6        # for warning/splash screens (simpler visuals)
+TEMPLATE_SCALES = (0.5, 0.25)  # downscaled copies precomputed for each reference
+
+# Coarse-to-fine ("pyramid") matching — default for wait_for_image / wait_and_click
+MATCH_MODE = "pyramid"          # "pyramid" or "full"
+PYRAMID_MIN_TEMPLATE_SIZE = 10  # skip pyramid levels where the reference gets smaller than this
+PYRAMID_COARSE_THRESHOLD = 0.5  # coarse-level score needed to refine a candidate
+PYRAMID_CANDIDATES = 3          # candidates refined at full resolution
+
+# Learned region-of-interest hints: search around a reference's last location first
+LOCATION_CACHE_PATH = os.path.join(STATE_DIR, "locations.json")
+ROI_PADDING = 40                # pixels searched around the remembered location
+LOCATION_TOLERANCE = 4          # pixels a reference can move before its location is updated
+
+# Screen-graph navigation (navigator.Navigator): measured seconds per transition
+TRANSITION_COSTS_PATH = os.path.join(STATE_DIR, "transition_costs.json")
+TRANSITION_COST_SMOOTHING = 0.3  # weight of the newest measurement in the moving average
+TRANSITION_COSTS_FLUSH_EVERY = 10 # recorded transitions between writes of the costs file
 
 # Reference image paths
 REF_WARNING_CONTINUE = os.path.join(REFERENCES_DIR, "warning_continue.png")
@@ -50,9 +86,15 @@ SERVICE_LIST_RIGHT = 2664
 SERVICE_LIST_BOTTOM = 912
 SERVICE_BOX_HEIGHT = 59       # actual box height in pixels
 SERVICE_BOX_STRIDE = 71       # distance between box tops (59 box + 12 gap)
-SCROLL_PER_BOX = -268         # scroll clicks to move one box down (-2140 / 8)
+SCROLL_PER_BOX = -268         # scroll clicks per box until calibrated (see scroll_calibration.py)
 SERVICE_BOX_BORDER_RGB = (0x57, 0xa6, 0xd0)  # #57a6d0 — border color of service rectangles
 SERVICE_BOX_COLOR_TOLERANCE = 20              # per-channel tolerance for color matching
+SERVICE_FINGERPRINT_SIZE = (128, 16)          # (width, height) of service and train box thumbnails
+SERVICE_SAME_MAX_CHANGED = 0.002              # share of differing pixels below which two boxes match
+SERVICE_FINGERPRINT_MAX_DIFF = 4.0            # mean thumbnail difference for a box to match its index
+SERVICE_LIST_REGION = (SERVICE_LIST_LEFT, SERVICE_LIST_TOP,
+                       SERVICE_LIST_RIGHT - SERVICE_LIST_LEFT,
+                       SERVICE_LIST_BOTTOM - SERVICE_LIST_TOP)   # (left, top, width, height)
 LEVEL_LOAD_TIMEOUT = 180     # seconds to wait for a level to load
 
 # Schedule screen area (pixel coordinates)
@@ -64,20 +106,86 @@ SCHEDULE_BOTTOM = 902
 SCHEDULE_TOP_BORDER_RGB = (0x05, 0x97, 0x44)     # #059744 — top border of schedule
 SCHEDULE_BOTTOM_BORDER_RGB = (0xc5, 0xe4, 0xe9)  # #c5e4e9 — bottom border of schedule
 SCHEDULE_COLOR_TOLERANCE = 20
+SCHEDULE_OVERLAP_MAX_DIFF = 5.0     # mean abs difference of a frame-to-frame band match
+SCHEDULE_OVERLAP_IGNORE_ROWS = 6    # most different band rows left out of that mean (a blinking clock)
+SCHEDULE_OVERLAP_COLUMN_STEP = 8    # columns averaged into one for the coarse overlap search
+SCHEDULE_OVERLAP_CANDIDATES = 8     # best coarse rows re-checked at full resolution
+SCHEDULE_REGION = (SCHEDULE_LEFT, SCHEDULE_TOP,
+                   SCHEDULE_RIGHT - SCHEDULE_LEFT, SCHEDULE_BOTTOM - SCHEDULE_TOP)
 
 # Train scroll box (pixel coordinates)
 TRAIN_BOX_LEFT = 3218
 TRAIN_BOX_TOP = 418
 TRAIN_BOX_WIDTH = 450
 TRAIN_BOX_HEIGHT = 472
-TRAIN_SCROLL_PER_BOX = -310   # scroll clicks to move one train box down
+TRAIN_BOX_REGION = (TRAIN_BOX_LEFT, TRAIN_BOX_TOP, TRAIN_BOX_WIDTH, TRAIN_BOX_HEIGHT)
+TRAIN_SCROLL_PER_BOX = -310   # scroll clicks per train box until calibrated
 TRAIN_VISIBLE_COUNT = 5       # trains visible without scrolling
 TRAIN_FIRST_Y_OFFSET = 47     # Y offset from TRAIN_BOX_TOP to center of first train
 TRAIN_BOX_STRIDE = 94         # distance between train box centers (472px / 5 trains ≈ 94)
+TRAIN_BORDER_RGB = (0xde, 0xde, 0xde)   # #dedede — left border of train boxes
+TRAIN_BORDER_TOLERANCE = 20
+TRAIN_MIN_ENTRY_HEIGHT = 40   # shorter border runs aren't train boxes
+
+# Measured scrolling (scroll_calibration.py)
+SCROLL_CALIBRATION_PATH = os.path.join(STATE_DIR, "scroll_calibration.json")
+SCROLL_MATCH_BAND = 48        # rows of one grab searched for in the other
+SCROLL_MATCH_MARGIN = 24      # extra overlap kept beyond the band, for scrolls that overshoot
+SCROLL_MATCH_MIN_STD = 8.0    # grayscale std-dev a band needs to be worth matching
+SCROLL_MATCH_MIN_SCORE = 0.8  # correlation needed to trust a measured displacement
+SCROLL_CONFIRM_MAX_DIFF = 6.0 # mean grayscale difference over the whole overlap that confirms it
+SCROLL_TOLERANCE = 3          # pixels off target that count as landed
+SCROLL_MAX_STEPS = 12         # scrolls allowed to reach one target position
+SCROLL_MAX_PAGES = 40         # page scrolls allowed while stitching a whole list
+SCROLL_CALIBRATION_SMOOTHING = 0.3  # weight of each new in-run measurement
+SCROLL_CALIBRATION_FLUSH_EVERY = 10 # learned measurements between writes of the calibration file
+TRAIN_INDEX_DIR = os.path.join(STATE_DIR, "train_lists")   # saved train-list indexes
+
+# Job queue: several routes/classes in one session (see jobs.py). Without
+# this file, ROUTE_NAME / TRAIN_CLASS / MAX_SERVICES_PER_TRAIN make one job.
+JOBS_FILE = os.path.join(BASE_DIR, "jobs.json")
+
+# Game health (see health.py): the game is only relaunched between services
+# once one of these is crossed. Slowdowns compare the median of the latest
+# samples with the median of the first ones after launch.
+HEALTH_STATS_SOURCE = "auto"  # "auto" (psutil if installed), "psutil", "fake" or "none"
+HEALTH_MAX_RSS_MB = 12000     # game's resident memory
+HEALTH_LOAD_SLOWDOWN = 1.5    # level loads
+HEALTH_UI_SLOWDOWN = 2.0      # each menu transition
+HEALTH_GRAB_SLOWDOWN = 2.0    # full-desktop screen grabs
+HEALTH_LOAD_WINDOW = 5        # samples per median for level loads (one per service)
+HEALTH_UI_WINDOW = 10         # samples per median for each menu transition: a single
+                              # transition swings with input timing, so a short median is noise
+HEALTH_GRAB_WINDOW = 30       # samples per median for screen grabs
+
+# Stuck-state recovery (see watchdog.py)
+WATCHDOG_STALL_SECONDS = 600  # no navigation or level-load progress for this long = stuck
+WATCHDOG_ESCAPES = 4          # Escape presses tried before closing the game
+WATCHDOG_ATTEMPTS = 3         # tries per service (or train list) before giving up
 
 # Limits (None = unlimited)
 MAX_SERVICES_PER_TRAIN = 1    # cap services per train for faster testing
 
+# Adaptive wait scheduling (see wait_scheduler.py). The timeouts above are
+# ceilings; once a screen has history, a wait past
+# max(WAIT_MIN_TIMEOUT, p95 * WAIT_TIMEOUT_FACTOR + WAIT_TIMEOUT_SLACK)
+# is reported as overdue but carries on to the ceiling.
+WAIT_HISTORY_PATH = os.path.join(STATE_DIR, "wait_history.json")
+WAIT_HISTORY_SIZE = 50        # recorded waits kept per route/screen
+WAIT_HISTORY_FLUSH_EVERY = 10 # recorded waits between writes of the history file
+WAIT_MIN_SAMPLES = 5          # recorded waits needed before a screen's schedule adapts
+WAIT_MIN_INTERVAL = 0.25      # poll interval around the expected arrival time
+WAIT_MAX_INTERVAL = 3.0       # poll interval while the screen can't be there yet
+WAIT_TIMEOUT_FACTOR = 2.0
+WAIT_TIMEOUT_SLACK = 10.0     # seconds
+WAIT_MIN_TIMEOUT = 15.0       # seconds
+
+# Click acknowledgement (utils.click_and_confirm)
+CLICK_ACK_TIMEOUT = 0.6       # seconds to watch for a reaction before re-checking the element
+CLICK_ACK_INTERVAL = 0.03     # seconds between checks of the screen
+CLICK_ACK_PADDING = 20        # pixels around the element a hover highlight can repaint
+CLICK_ACK_MIN_CHANGE = 0.01   # share of the screen outside the element that must change (in two frames in a row)
+
 # Retry settings (when a click doesn't register and the screen doesn't change)
 RETRY_MAX = 3                # total click attempts before giving up
-RETRY_WAIT = 30              # seconds to wait for screen change before retrying click
+RETRY_WAIT = 30              # seconds to wait for a level to load before re-clicking the service
@@ -0,0 +1,94 @@
+"""Cheap, early-exit comparison of two frames.
+
+Rows are compared in a progressive order (bit-reversed, so every prefix
+of the order is spread evenly down the frame), a chunk at a time, on
+uint8 with cv2.absdiff. After each chunk the running difference and its
+standard error across the rows seen so far decide whether the answer is
+already clear: once the difference is more than COMPARE_Z standard
+errors from the threshold, the rest of the frame is skipped. Every
+decision carries a confidence: 1.0 when every row was compared,
+otherwise the normal-approximation probability that comparing the rest
+wouldn't change it.
+
+Frames can also be reduced to compact signatures first (signature()),
+which compare the same way at a fraction of the cost.
+"""
+import collections
+import functools
+import math
+
+import cv2
+import numpy as np
+
+import capture
+import config
+
+# same: the frames are within the threshold; difference: estimated value of
+# the metric; confidence: 0.5-1.0; rows: rows compared before deciding
+Comparison = collections.namedtuple("Comparison", "same difference confidence rows")
+
+
+def signature(frame, step=config.CHANGE_GATE_STEP):
+    """Return a compact signature of a frame (every `step`-th pixel on a grid)."""
+    return capture.frame_signature(frame, step)
+
+
+@functools.lru_cache(maxsize=32)
+def _row_order(height):
+    """Row indices in bit-reversed order: 0, h/2, h/4, 3h/4, ..."""
+    bits = max(1, (height - 1).bit_length())
+    rows = np.arange(height)
+    reversed_bits = np.zeros(height, dtype=np.int64)
+    for bit in range(bits):
+        reversed_bits |= ((rows >> bit) & 1) << (bits - 1 - bit)
+    return np.argsort(reversed_bits, kind="stable")
+
+
+def _row_values(a, b, rows, metric, pixel_tol):
+    diff = cv2.absdiff(a[rows], b[rows]).reshape(len(rows), -1)
+    if metric == "mean":
+        return diff.mean(axis=1)
+    return np.count_nonzero(diff > pixel_tol, axis=1) / diff.shape[1]
+
+
+def compare(a, b, threshold, metric="mean", pixel_tol=32, early_same=True):
+    """Compare two equally sized uint8 frames (or signatures) against a threshold.
+
+    metric "mean": mean absolute difference per channel value; "changed":
+    share of channel values differing by more than `pixel_tol`. The frames
+    count as the same when the metric is below `threshold`. With
+    early_same=False, only a clear difference ends the comparison early —
+    for differences that may sit in a few rows (e.g. a few characters of
+    text). Returns a Comparison.
+    """
+    if a.shape != b.shape:
+        return Comparison(False, float("inf"), 1.0, 0)
+    height = a.shape[0]
+    order = _row_order(height)
+    row_size = a[0].size
+    values = np.empty(height)
+
+    seen = 0
+    chunk = config.COMPARE_FIRST_ROWS
+    while True:
+        end = min(height, seen + chunk)
+        values[seen:end] = _row_values(a, b, order[seen:end], metric, pixel_tol)
+        seen = end
+        chunk *= 2
+
+        difference = float(values[:seen].mean())
+        same = difference < threshold
+        if seen == height:
+            return Comparison(same, difference, 1.0, seen)
+        if seen < config.COMPARE_MIN_ROWS or (same and not early_same):
+            continue
+
+        # Standard error of the mean over the rows not yet compared; a
+        # spread of zero still leaves one unit of row resolution unknown
+        remaining = 1.0 - seen / height
+        spread = max(float(values[:seen].std(ddof=1)), 1.0 / row_size)
+        error = spread * math.sqrt(remaining / seen)
+        margin = abs(difference - threshold) / error
+        if margin > config.COMPARE_Z:
+            confidence = 0.5 * (1.0 + math.erf(margin / math.sqrt(2)))
+            return Comparison(same, difference, confidence, seen)
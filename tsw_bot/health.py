@@ -0,0 +1,246 @@
+"""Game health monitoring and the relaunch policy.
+
+TSW gets heavier the longer it runs, so instead of quitting between every
+train, the bot watches the game and relaunches it only when a threshold in
+config.py is crossed:
+
+    memory        the game process's resident memory (HEALTH_MAX_RSS_MB)
+    level loads   recent loads vs the first ones after launch (HEALTH_LOAD_SLOWDOWN)
+    UI response   recent menu transitions vs the first ones (HEALTH_UI_SLOWDOWN)
+    screen grabs  recent grab latency vs the first grabs once the bot reaches
+                  the train list (HEALTH_GRAB_SLOWDOWN)
+
+Process stats come from a pluggable source:
+
+    psutil   the game process, found by config.GAME_PROCESS_NAME (optional dependency)
+    fake     stats set by hand, for trying the policy without the game
+    none     no process stats; only the timing signals are used
+
+Watch the game process's stats while playing with:
+    python health.py [--source NAME] [--seconds N]
+"""
+import argparse
+import collections
+import time
+
+import numpy as np
+
+import config
+
+
+class StatsSource:
+    """Base class: report resource use of the game process."""
+
+    name = "base"
+
+    def rss(self):
+        """Return the game's resident memory in bytes, or None if unknown."""
+        raise NotImplementedError
+
+
+class PsutilSource(StatsSource):
+    """Read the game process's stats with psutil."""
+
+    name = "psutil"
+
+    def __init__(self, process_name=None):
+        import psutil  # optional dependency
+        self._psutil = psutil
+        self.process_name = (process_name or config.GAME_PROCESS_NAME).lower()
+        self._process = None
+
+    def _find(self):
+        if self._process is not None and self._process.is_running():
+            return self._process
+        self._process = None
+        for proc in self._psutil.process_iter(["name"]):
+            if (proc.info["name"] or "").lower() == self.process_name:
+                self._process = proc
+                break
+        return self._process
+
+    def rss(self):
+        proc = self._find()
+        if proc is None:
+            return None
+        try:
+            return proc.memory_info().rss
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+            self._process = None
+            return None
+
+
+class FakeSource(StatsSource):
+    """Stats set by hand. `rss_bytes` may be a number, None, or a callable returning one."""
+
+    name = "fake"
+
+    def __init__(self, rss_bytes=None):
+        self.rss_bytes = rss_bytes
+
+    def rss(self):
+        return self.rss_bytes() if callable(self.rss_bytes) else self.rss_bytes
+
+
+class NoSource(StatsSource):
+    """No process stats available."""
+
+    name = "none"
+
+    def rss(self):
+        return None
+
+
+SOURCES = {
+    "psutil": PsutilSource,
+    "fake": FakeSource,
+    "none": NoSource,
+}
+
+
+def get_source(name=None):
+    """Create a stats source by name. 'auto' prefers psutil and falls back to none."""
+    name = name or config.HEALTH_STATS_SOURCE
+    if name == "auto":
+        try:
+            return PsutilSource()
+        except ImportError:
+            print("       psutil not installed — game memory won't be monitored")
+            return NoSource()
+    if name not in SOURCES:
+        raise ValueError(f"Unknown stats source '{name}' "
+                         f"(expected one of: auto, {', '.join(SOURCES)})")
+    return SOURCES[name]()
+
+
+class Trend:
+    """How much slower recent samples are than the first ones since launch.
+
+    The baseline is the median of the first `window` samples, the recent
+    level the median of the last `window`; the two never overlap.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.baseline = []
+        self.recent = collections.deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if len(self.baseline) < self.window:
+            self.baseline.append(value)
+        else:
+            self.recent.append(value)
+
+    def slowdown(self):
+        """Return recent / baseline median, or None until both windows are full."""
+        if len(self.recent) < self.window:
+            return None
+        baseline = float(np.median(self.baseline))
+        if baseline <= 0:
+            return None
+        return float(np.median(list(self.recent))) / baseline
+
+
+class HealthMonitor:
+    """Collects health signals for the running game and decides when to relaunch."""
+
+    def __init__(self, source=None):
+        self._source = source
+        self.relaunches = 0
+        self.reset()
+
+    @property
+    def source(self):
+        if self._source is None or isinstance(self._source, str):
+            self._source = get_source(self._source)
+        return self._source
+
+    def reset(self):
+        """Forget every sample — call when the game has just been launched."""
+        self.launched = time.time()
+        self.steady = False
+        self.loads = Trend(config.HEALTH_LOAD_WINDOW)
+        self.grabs = Trend(config.HEALTH_GRAB_WINDOW)
+        self.transitions = {}
+
+    def record_load(self, seconds):
+        """Record how long a level load took."""
+        self.loads.add(seconds)
+
+    def mark_steady(self):
+        """Start timing screen grabs — call once the game is past launch and loading.
+
+        Grabs while the game starts up are slower, and would hide later
+        degradation if they made up the baseline.
+        """
+        self.steady = True
+
+    def record_grab(self, seconds):
+        """Record how long a screen grab took (called from the grabber thread)."""
+        if self.steady:
+            self.grabs.add(seconds)
+
+    def record_transition(self, name, seconds):
+        """Record how long a menu transition took."""
+        self.transitions.setdefault(name, Trend(config.HEALTH_UI_WINDOW)).add(seconds)
+
+    def check(self):
+        """Return why the game should be relaunched, or None if it looks healthy."""
+        rss = self.source.rss()
+        if rss is not None and rss > config.HEALTH_MAX_RSS_MB * 1024 * 1024:
+            return f"game is using {rss / 1024 / 1024:.0f} MB (limit {config.HEALTH_MAX_RSS_MB})"
+
+        slowdown = self.loads.slowdown()
+        if slowdown is not None and slowdown > config.HEALTH_LOAD_SLOWDOWN:
+            return f"level loads are {slowdown:.1f}x slower than after launch"
+
+        for name, trend in self.transitions.items():
+            slowdown = trend.slowdown()
+            if slowdown is not None and slowdown > config.HEALTH_UI_SLOWDOWN:
+                return f"'{name}' is {slowdown:.1f}x slower than after launch"
+
+        slowdown = self.grabs.slowdown()
+        if slowdown is not None and slowdown > config.HEALTH_GRAB_SLOWDOWN:
+            return f"screen grabs are {slowdown:.1f}x slower than after launch"
+        return None
+
+    def summary(self):
+        """Return a one-line description of the current signals, for logging."""
+        rss = self.source.rss()
+        parts = [f"up {(time.time() - self.launched) / 60:.0f} min"]
+        if rss is not None:
+            parts.append(f"{rss / 1024 / 1024:.0f} MB")
+        slowdown = self.loads.slowdown()
+        if slowdown is not None:
+            parts.append(f"loads x{slowdown:.2f}")
+        slowdown = self.grabs.slowdown()
+        if slowdown is not None:
+            parts.append(f"grabs x{slowdown:.2f}")
+        return ", ".join(parts)
+
+
+# The bot drives a single game, so one monitor is shared by every module
+monitor = HealthMonitor()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch the game process's stats.")
+    parser.add_argument("--source", default=None,
+                        help="stats source (default: config.HEALTH_STATS_SOURCE)")
+    parser.add_argument("--seconds", type=float, default=60.0,
+                        help="how long to watch")
+    args = parser.parse_args()
+
+    source = get_source(args.source)
+    print(f"=== Game health ({source.name}) ===\n")
+    end = time.time() + args.seconds
+    while time.time() < end:
+        rss = source.rss()
+        print("  game not found" if rss is None else f"  {rss / 1024 / 1024:8.0f} MB")
+        time.sleep(5)
+
+
+if __name__ == "__main__":
+    main()
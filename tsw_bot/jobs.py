@@ -0,0 +1,69 @@
+"""Job queue: the routes, classes and trains to capture in one game session.
+
+Jobs are read from a JSON file (config.JOBS_FILE by default):
+
+    [
+        {"route": "WCML South - London Euston to Milton Keynes",
+         "class": "Class 390",
+         "trains": [1, 2, 5],        optional, 1-based (default: every train)
+         "max_services": 3,          optional, null = unlimited
+                                     (default: config.MAX_SERVICES_PER_TRAIN)
+         "folder": "euston_390"}     optional, under screenshots/
+                                     (default: <route>/<class>)
+    ]
+
+Without a jobs file, the single route and class in config.py are run.
+"""
+import collections
+import json
+import os
+
+import config
+
+Job = collections.namedtuple("Job", "route train_class trains max_services output_dir")
+
+
+def default_job():
+    """The job described by config.ROUTE_NAME / TRAIN_CLASS / MAX_SERVICES_PER_TRAIN."""
+    return Job(config.ROUTE_NAME, config.TRAIN_CLASS, None, config.MAX_SERVICES_PER_TRAIN,
+               os.path.join(config.SCREENSHOTS_DIR, config.ROUTE_NAME, config.TRAIN_CLASS))
+
+
+def _parse(number, entry):
+    if not isinstance(entry, dict) or "route" not in entry or "class" not in entry:
+        raise ValueError(f"Job {number}: needs at least 'route' and 'class'")
+    trains = entry.get("trains")
+    if trains is not None and (not isinstance(trains, list)
+                               or not all(isinstance(t, int) and t >= 1 for t in trains)):
+        raise ValueError(f"Job {number}: 'trains' must be a list of train numbers (1-based)")
+    folder = entry.get("folder") or os.path.join(entry["route"], entry["class"])
+    return Job(entry["route"], entry["class"], sorted(set(trains)) if trains else None,
+               entry.get("max_services", config.MAX_SERVICES_PER_TRAIN),
+               os.path.join(config.SCREENSHOTS_DIR, folder))
+
+
+def load(path=None):
+    """Return the jobs to run, grouped so jobs on the same route run back to back.
+
+    Routes keep the order they first appear in; jobs within a route keep
+    file order. Returns [default_job()] if there is no jobs file. Raises
+    ValueError for a malformed file or two jobs sharing an output folder.
+    """
+    path = path or config.JOBS_FILE
+    if not os.path.isfile(path):
+        return [default_job()]
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path}: expected a non-empty list of jobs")
+    jobs = [_parse(number, entry) for number, entry in enumerate(entries, 1)]
+
+    folders = collections.Counter(job.output_dir for job in jobs)
+    shared = [folder for folder, count in folders.items() if count > 1]
+    if shared:
+        raise ValueError(f"{path}: several jobs write to {shared[0]} — give them a 'folder'")
+
+    first_seen = {}
+    for job in jobs:
+        first_seen.setdefault(job.route, len(first_seen))
+    return sorted(jobs, key=lambda job: first_seen[job.route])
@@ -0,0 +1,110 @@
+"""Append-only checkpoint journal for a job.
+
+Every finished step of a crawl is appended to journal.jsonl in the job's
+output folder as soon as it is done, one JSON object per line:
+
+    {"event": "run", "time": ..., "route": ..., "train_class": ..., "resume": bool}
+    {"event": "indexed", "train": 3, "services": 12, "seconds": 41.2}
+    {"event": "service", "train": 3, "service": 5, "offset": 1240,
+     "time": ..., "seconds": 88.1, "dir": ..., "schedule": ...}
+    {"event": "train", "train": 3, "services": 12}
+
+A run interrupted at any point keeps everything up to its last finished
+service, and `main.py --resume` carries on from the first service that
+isn't in the journal. Only services whose schedule was saved are
+recorded, and a train only once all of its services are, so a service
+that failed is tried again on resume. report.txt is generated from the journal, so it
+covers every session that contributed to the job.
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+
+class Journal:
+    """The journal of one job's output folder."""
+
+    def __init__(self, output_dir, resume=False):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, "journal.jsonl")
+        os.makedirs(output_dir, exist_ok=True)
+        if not os.path.isfile(self.path):
+            return
+        if not resume:
+            os.remove(self.path)   # a fresh run overwrites the job's screenshots too
+            return
+        # Terminate a line cut short by a crash, so the next event starts its own
+        with open(self.path, "rb+") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def record(self, event, **fields):
+        """Append one event and make sure it has reached the disk."""
+        line = json.dumps({"event": event, **fields})
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def events(self, event=None):
+        """Return the recorded events (of one kind, if given), oldest first.
+
+        A line cut short by a crash is ignored.
+        """
+        if not os.path.isfile(self.path):
+            return []
+        events = []
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if event is None or entry.get("event") == event:
+                    events.append(entry)
+        return events
+
+    def completed_trains(self):
+        """Return the numbers of trains whose every service is recorded."""
+        return {e["train"] for e in self.events("train")}
+
+    def completed_services(self, train_number):
+        """Return the numbers of the services recorded for a train."""
+        return {e["service"] for e in self.events("service") if e["train"] == train_number}
+
+    def write_report(self):
+        """Write report.txt from the journal. Returns its path."""
+        runs = self.events("run")
+        services = self.events("service")
+        indexed = self.events("indexed")
+
+        trains = {}   # train number -> [service count, seconds]
+        for entry in indexed + services:
+            totals = trains.setdefault(entry["train"], [0, 0.0])
+            totals[1] += entry["seconds"]
+        for entry in services:
+            trains[entry["train"]][0] += 1
+        total_seconds = sum(seconds for _, seconds in trains.values())
+
+        first = runs[0] if runs else {"time": time.time(), "route": "?", "train_class": "?"}
+        report_path = os.path.join(self.output_dir, "report.txt")
+        with open(report_path, "w") as f:
+            f.write(f"TSW Timetable Bot — Run Report\n")
+            f.write(f"{'='*40}\n\n")
+            f.write(f"Route:       {first['route']}\n")
+            f.write(f"Train Class: {first['train_class']}\n")
+            f.write(f"Started:     {datetime.fromtimestamp(first['time']):%Y-%m-%d %H:%M:%S}\n")
+            f.write(f"Sessions:    {max(len(runs), 1)}\n")
+            f.write(f"Duration:    {timedelta(seconds=int(total_seconds))}\n")
+            f.write(f"Trains:      {len(trains)}\n")
+            f.write(f"Services:    {len(services)}\n\n")
+            f.write(f"{'Train':<10} {'Services':<10} {'Duration'}\n")
+            f.write(f"{'-'*10} {'-'*10} {'-'*10}\n")
+            for train_num in sorted(trains):
+                svc_count, seconds = trains[train_num]
+                f.write(f"Train {train_num:<4} {svc_count:<10} {timedelta(seconds=int(seconds))}\n")
+        return report_path
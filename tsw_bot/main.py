@@ -1,25 +1,23 @@
+import argparse
 import os
 import sys
 
 import pyautogui
 pyautogui.FAILSAFE = False
 
+import capture
 import config
-from navigator import (
-    launch_game,
-    pass_warning_screen,
-    pass_splash_screen,
-    click_to_the_trains,
-    click_choose_a_route,
-    wait_for_route_screen,
-    select_route,
-    click_timetable,
-    select_train_class,
-)
+import health
+import jobs
+import matching
+import templates
+import utils
+import watchdog
+from navigator import TRAIN_LIST, nav
 
 
 def check_references():
-    """Verify that all required reference images exist."""
+    """Verify that all required reference images exist, then preload every reference."""
     required = [
         config.REF_WARNING_CONTINUE,
         config.REF_SPLASH_CONTINUE,
@@ -40,31 +38,61 @@ def check_references():
             print(f"  - {os.path.basename(path)}")
         print(f"\nPlease add them to: {config.REFERENCES_DIR}")
         return False
+
+    unreadable = [path for path in templates.load_all() if os.path.isfile(path)]
+    if unreadable:
+        print("ERROR: Could not decode reference images:")
+        for path in unreadable:
+            print(f"  - {os.path.basename(path)}")
+        return False
     return True
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Capture TSW timetables.")
+    parser.add_argument("--jobs", default=config.JOBS_FILE,
+                        help="JSON job list (see jobs.py; default: jobs.json beside this "
+                             "script, or the route/class in config.py if it doesn't exist)")
+    parser.add_argument("--resume", action="store_true",
+                        help="carry on from each job's journal instead of starting over")
+    args = parser.parse_args()
+
     print("=== TSW Timetable Bot ===\n")
 
+    try:
+        job_list = jobs.load(args.jobs)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
     if not check_references():
         sys.exit(1)
 
     os.makedirs(config.SCREENSHOTS_DIR, exist_ok=True)
+    capture.start()
 
     try:
-        launch_game()
-        pass_warning_screen()
-        pass_splash_screen()
-        click_to_the_trains()
-        click_choose_a_route()
-        wait_for_route_screen()
-        select_route()
-        click_timetable()
-        select_train_class()
+        nav.go_to(TRAIN_LIST, route=job_list[0].route, train_class=job_list[0].train_class)
         print("\nTrain list reached — starting train loop.\n")
 
         from service_loop import process_all_trains
-        process_all_trains()
+        for number, job in enumerate(job_list, 1):
+            print(f"\n{'#'*50}")
+            print(f"### Job {number}/{len(job_list)}: {job.route} — {job.train_class}")
+            print(f"{'#'*50}")
+            process_all_trains(job, resume=args.resume)
+
+        grab_stats = capture.stats()
+        print(f"Screen grabs: {grab_stats['grabs']} for {grab_stats['reads']} frame reads")
+        roi = matching.roi_stats()
+        print(f"Location hints: {roi['hits']} hits (full-frame searches skipped), "
+              f"{roi['misses']} misses")
+        print(f"Health relaunches: {health.monitor.relaunches}")
+        print(f"Stuck-state recoveries: {sum(watchdog.recoveries.values())} "
+              f"{dict(watchdog.recoveries)}")
+        gated = utils.gate_stats()
+        print(f"Change gate: {gated['evaluated']} frames matched, "
+              f"{gated['skipped']} unchanged frames skipped")
     except TimeoutError as e:
         print(f"\nERROR: {e}")
         print("The bot could not find the expected screen element.")
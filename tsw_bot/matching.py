@@ -0,0 +1,256 @@
+"""Template matching against frames from the shared capture buffer."""
+import atexit
+import collections
+import json
+import os
+
+import cv2
+
+import capture
+import config
+import templates
+
+Box = collections.namedtuple("Box", "left top width height")
+
+
+# Downscaled grayscale copies of the most recent frame, shared by every
+# template matched against it: (frame, {scale: gray})
+_pyramid_cache = (None, {})
+
+
+def _frame_level(frame, scale):
+    """Return the frame downscaled to `scale` in grayscale, cached per frame."""
+    global _pyramid_cache
+    cached_frame, levels = _pyramid_cache
+    if cached_frame is not frame:
+        levels = {}
+        _pyramid_cache = (frame, levels)
+    if scale not in levels:
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, round(w * scale)), max(1, round(h * scale))),
+                           interpolation=cv2.INTER_AREA)
+        levels[scale] = cv2.cvtColor(small, cv2.COLOR_RGB2GRAY)
+    return levels[scale]
+
+
+def _match_full(frame, template):
+    result = cv2.matchTemplate(frame, template.rgb, cv2.TM_CCOEFF_NORMED)
+    _, best, _, (x, y) = cv2.minMaxLoc(result)
+    return float(best), Box(x, y, template.width, template.height)
+
+
+def _coarse_candidates(result, template_size, count, threshold):
+    """Pick up to `count` separated peaks at or above threshold from a match result."""
+    result = result.copy()
+    tw, th = template_size
+    peaks = []
+    for _ in range(count):
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        if score < threshold:
+            break
+        peaks.append((x, y))
+        # Suppress this peak's neighbourhood so the next one is a different spot
+        result[max(0, y - th):y + th + 1, max(0, x - tw):x + tw + 1] = -1.0
+    return peaks
+
+
+def _match_pyramid(frame, template):
+    """Coarse-to-fine match: grayscale search on a downscaled level, then a
+    full-resolution colour match in a small window around each candidate.
+
+    The returned confidence comes from the full-resolution match, so it is
+    directly comparable to config.CONFIDENCE / CONFIDENCE_LOW. When no
+    coarse candidate is worth refining, the (lower-bound) coarse score is
+    returned with no box. Falls back to a full match if the template is
+    too small to survive downscaling.
+    """
+    usable = [scale for scale in sorted(template.scaled)
+              if min(template.scaled[scale].shape[:2]) >= config.PYRAMID_MIN_TEMPLATE_SIZE]
+    if not usable:
+        return _match_full(frame, template)
+    scale = usable[0]  # coarsest level the template survives at
+    needle = template.scaled[scale]
+    level = _frame_level(frame, scale)
+    if needle.shape[0] > level.shape[0] or needle.shape[1] > level.shape[1]:
+        return _match_full(frame, template)
+
+    result = cv2.matchTemplate(level, needle, cv2.TM_CCOEFF_NORMED)
+    peaks = _coarse_candidates(result, (needle.shape[1], needle.shape[0]),
+                               config.PYRAMID_CANDIDATES, config.PYRAMID_COARSE_THRESHOLD)
+    if not peaks:
+        return float(result.max()), None
+
+    # Refine each candidate at full resolution
+    pad = int(round(1 / scale)) + 2
+    best, best_box = 0.0, None
+    for x, y in peaks:
+        score, box = _match_window(frame, template, int(x / scale), int(y / scale), pad)
+        if box is not None and score > best:
+            best, best_box = score, box
+    return best, best_box
+
+
+def _match_window(frame, template, x, y, pad):
+    """Full-resolution match in a window of `pad` pixels around a template placed at (x, y)."""
+    fh, fw = frame.shape[:2]
+    left = max(0, x - pad)
+    top = max(0, y - pad)
+    right = min(fw, x + template.width + pad)
+    bottom = min(fh, y + template.height + pad)
+    window = frame[top:bottom, left:right]
+    if window.shape[0] < template.height or window.shape[1] < template.width:
+        return 0.0, None
+    score, box = _match_full(window, template)
+    return score, Box(left + box.left, top + box.top, box.width, box.height)
+
+
+# Where each reference was last found, persisted between runs so menu
+# tiles can be checked in a small region first: {file name: [l, t, w, h]}
+_locations = None
+_locations_unsaved = False
+_roi_stats = collections.Counter()
+
+
+def _load_locations():
+    global _locations
+    if _locations is None:
+        _locations = {}
+        if os.path.isfile(config.LOCATION_CACHE_PATH):
+            try:
+                with open(config.LOCATION_CACHE_PATH) as f:
+                    _locations = json.load(f)
+            except (OSError, ValueError):
+                print("       WARNING: Ignoring unreadable location cache")
+    return _locations
+
+
+def flush_locations():
+    """Write the location cache if a reference has moved since it was last saved."""
+    global _locations_unsaved
+    if _locations_unsaved:
+        os.makedirs(os.path.dirname(config.LOCATION_CACHE_PATH), exist_ok=True)
+        with open(config.LOCATION_CACHE_PATH, "w") as f:
+            json.dump(_locations, f, indent=2)
+        _locations_unsaved = False
+
+
+atexit.register(flush_locations)
+
+
+def _remember(image_path, box):
+    """Record where a reference was found, unless it's within LOCATION_TOLERANCE of before.
+
+    The cache is written at exit (see flush_locations).
+    """
+    global _locations_unsaved
+    locations = _load_locations()
+    key = os.path.basename(image_path)
+    previous = locations.get(key)
+    if previous is not None and all(abs(a - b) <= config.LOCATION_TOLERANCE
+                                    for a, b in zip(previous, box)):
+        return
+    locations[key] = list(box)
+    _locations_unsaved = True
+
+
+def roi_stats():
+    """Return how often the remembered-location search hit or missed.
+
+    Each hit is a whole-frame search that didn't have to run.
+    """
+    return {"hits": _roi_stats["hits"], "misses": _roi_stats["misses"]}
+
+
+def match(image_path, frame=None, mode="full", confidence=None):
+    """Return (confidence, Box) for the best match of an image in a frame.
+
+    Uses the latest shared frame if none is given. `mode` is "full" for an
+    exhaustive colour match or "pyramid" for coarse-to-fine matching. A
+    pyramid result below `confidence` is re-checked with a full match, so
+    it never misses what "full" finds; without `confidence` there is no
+    threshold to trust it against, and the full match is used.
+    Confidence is 0.0 and the box is None if the reference can't be loaded
+    or doesn't fit.
+
+    When `confidence` is given, a padded region around where the image was
+    last found is searched first, and the whole frame only if that scores
+    below `confidence`. Matches at or above `confidence` update the cache.
+    """
+    if frame is None:
+        frame, _ = capture.get_frame()
+    template = templates.get(image_path)
+    if template is None:
+        return 0.0, None
+    if template.height > frame.shape[0] or template.width > frame.shape[1]:
+        return 0.0, None
+
+    if confidence is not None:
+        hint = _load_locations().get(template.name)
+        if hint is not None:
+            score, box = _match_window(frame, template, hint[0], hint[1], config.ROI_PADDING)
+            if box is not None and score >= confidence:
+                _roi_stats["hits"] += 1
+                _remember(image_path, box)
+                return score, box
+            _roi_stats["misses"] += 1
+
+    if mode == "pyramid" and confidence is not None:
+        best, box = _match_pyramid(frame, template)
+        # A template can score low once downscaled yet match exactly at full
+        # resolution, so a pyramid miss is confirmed by a full match
+        if box is None or best < confidence:
+            best, box = _match_full(frame, template)
+    else:
+        best, box = _match_full(frame, template)
+    if confidence is not None and box is not None and best >= confidence:
+        _remember(image_path, box)
+    return best, box
+
+
+def locate(image_path, frame=None, confidence=0.8, mode="full"):
+    """Return the Box of an image in a frame, or None if below confidence."""
+    best, box = match(image_path, frame, mode=mode, confidence=confidence)
+    if box is None or best < confidence:
+        return None
+    return box
+
+
+ScreenMatch = collections.namedtuple("ScreenMatch", "state ref box confidence")
+
+# How often each reference has won a classification, so the likeliest
+# variant is tried first and the common case costs a single match
+_variant_hits = collections.Counter()
+
+
+def classify(candidates, frame=None, confidence=0.8, exhaustive=False, mode="full"):
+    """Work out which of several screens is showing, from one frame.
+
+    `candidates` maps a screen state to its reference variants, e.g.
+    {"driver": [REF_DRIVER, REF_DRIVER_1], "get_started": [REF_GET_STARTED]}.
+    References are scored against the same frame, most frequent winner
+    first, and the first one at or above `confidence` wins. With
+    exhaustive=True every reference is scored and the best one wins.
+    `mode` is passed through to match().
+
+    Returns a ScreenMatch(state, ref, box, confidence), or None if nothing
+    reached `confidence`.
+    """
+    if frame is None:
+        frame, _ = capture.get_frame()
+
+    order = [(state, ref) for state, refs in candidates.items() for ref in refs]
+    order.sort(key=lambda item: -_variant_hits[item[1]])  # stable: ties keep caller order
+
+    best = None
+    for state, ref in order:
+        score, box = match(ref, frame, mode=mode, confidence=confidence)
+        if box is None or score < confidence:
+            continue
+        if best is None or score > best.confidence:
+            best = ScreenMatch(state, ref, box, score)
+        if not exhaustive:
+            break
+
+    if best is not None:
+        _variant_hits[best.ref] += 1
+    return best
@@ -1,12 +1,22 @@
+import atexit
+import collections
+import heapq
+import itertools
+import json
 import os
 import subprocess
 import time
 
-import numpy as np
 import pyautogui
 
+import capture
 import config
-from utils import wait_and_click, wait_for_image
+import health
+import matching
+import scroll_calibration
+import train_index
+import watchdog
+from utils import region_signature, wait_and_click, wait_for_image, wait_until_stable
 
 
 def launch_game():
@@ -18,6 +28,7 @@ def launch_game():
     )
     # Give Steam a moment to start the game process
     time.sleep(5)
+    health.monitor.reset()
 
 
 def pass_warning_screen():
@@ -26,7 +37,7 @@ def pass_warning_screen():
     if not wait_and_click(config.REF_WARNING_CONTINUE, timeout=config.GAME_LAUNCH_TIMEOUT, confidence=config.CONFIDENCE_LOW):
         raise TimeoutError("Timed out waiting for warning screen")
     print("       Clicked past warning screen.")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
 
 
 def pass_splash_screen():
@@ -35,7 +46,7 @@ def pass_splash_screen():
     if not wait_and_click(config.REF_SPLASH_CONTINUE, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE_LOW):
         raise TimeoutError("Timed out waiting for splash screen")
     print("       Clicked past splash screen.")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
 
 
 def click_to_the_trains():
@@ -44,7 +55,7 @@ def click_to_the_trains():
     if not wait_and_click(config.REF_TO_THE_TRAINS, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE):
         raise TimeoutError("Timed out waiting for 'To The Trains' tile")
     print("       Clicked 'To The Trains'.")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
 
 
 def click_choose_a_route():
@@ -53,7 +64,7 @@ def click_choose_a_route():
     if not wait_and_click(config.REF_CHOOSE_A_ROUTE, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE):
         raise TimeoutError("Timed out waiting for 'Choose a Route' tile")
     print("       Clicked 'Choose a Route'.")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
 
 
 def wait_for_route_screen():
@@ -83,14 +94,14 @@ def select_route(route_name=None):
     pyautogui.hotkey("ctrl", "a")
     time.sleep(0.2)
     pyautogui.typewrite(route_name, interval=0.03)
-    time.sleep(1.0)
+    wait_until_stable(ceiling=1.0)   # filtered list redraws
 
     # Press Enter twice to select
     print("       Pressing Enter to select route...")
     pyautogui.press("enter")
     time.sleep(0.5)
     pyautogui.press("enter")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
     print("       Route selected!")
 
 
@@ -100,7 +111,7 @@ def click_timetable():
     if not wait_and_click(config.REF_TIMETABLE, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE):
         raise TimeoutError("Timed out waiting for 'Timetable' tile")
     print("       Clicked 'Timetable'.")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable()
 
 
 def select_train_class(class_name=None):
@@ -120,7 +131,7 @@ def select_train_class(class_name=None):
     pyautogui.hotkey("ctrl", "a")
     time.sleep(0.2)
     pyautogui.typewrite(class_name, interval=0.03)
-    time.sleep(1.0)
+    wait_until_stable(ceiling=1.0)   # filtered list redraws
 
     # Press Enter, then right arrow, then Enter to select
     print("       Pressing Enter to select class...")
@@ -131,99 +142,80 @@ def select_train_class(class_name=None):
     time.sleep(0.5)
     print("       Pressing Enter to confirm...")
     pyautogui.press("enter")
-    time.sleep(config.CLICK_SETTLE_DELAY)
+    wait_until_stable(ceiling=config.CLICK_SETTLE_DELAY + 1.0)
+    # A freshly filtered train list starts at the top
+    scroll_calibration.train_list.reset()
     print("       Train class selected!")
-    time.sleep(1.0)
 
 
-def _detect_train_positions():
-    """Capture the train box and return Y centers of visible trains (screen coords).
-
-    Uses #dedede border detection on the left edge, same as count_visible_trains.
-    Returns a list of absolute screen Y coordinates for each train center.
+def visible_service_boxes(position=0):
+    """Return (list index, x, y) for each service box fully visible when the
+    list is scrolled `position` pixels from its top.
+    """
+    stride = config.SERVICE_BOX_STRIDE
+    center_x = (config.SERVICE_LIST_LEFT + config.SERVICE_LIST_RIGHT) // 2
+    # A box cut off by a few pixels of scroll error still counts as visible
+    index = max(0, -(-(position - config.SCROLL_TOLERANCE) // stride))
+    boxes = []
+    while True:
+        top = config.SERVICE_LIST_TOP + index * stride - position
+        if top + config.SERVICE_BOX_HEIGHT > config.SERVICE_LIST_BOTTOM + config.SCROLL_TOLERANCE:
+            return boxes
+        boxes.append((index, center_x, top + config.SERVICE_BOX_HEIGHT // 2))
+        index += 1
+
+
+def get_visible_service_boxes():
+    """Calculate the positions of visible service boxes in the scroll area."""
+    return [(x, y) for _, x, y in visible_service_boxes(0)]
+
+
+def scroll_service_list_to(offset):
+    """Scroll the service list to `offset` pixels from its top.
+
+    One calibrated scroll gesture however far it is, verified against
+    boxes remembered from earlier visits. Returns the position reached
+    (less than `offset` if the list ends first).
     """
-    region = (config.TRAIN_BOX_LEFT, config.TRAIN_BOX_TOP,
-              config.TRAIN_BOX_WIDTH, config.TRAIN_BOX_HEIGHT)
-    img = np.array(pyautogui.screenshot(region=region))
-
-    border_rgb = np.array([0xde, 0xde, 0xde])
-    strip = img[:, :3, :].astype(int)
-    match = np.all(np.abs(strip - border_rgb) <= 20, axis=2)
-    row_has_border = np.any(match, axis=1)
-
-    runs = []
-    in_run = False
-    run_start = 0
-    for r in range(len(row_has_border)):
-        if row_has_border[r] and not in_run:
-            run_start = r
-            in_run = True
-        elif not row_has_border[r] and in_run:
-            runs.append((run_start, r))
-            in_run = False
-    if in_run:
-        runs.append((run_start, len(row_has_border)))
-
-    # Filter to real entries (>= 40px) and convert to screen Y centers
-    positions = []
-    for s, e in runs:
-        if (e - s) >= 40:
-            center_y = config.TRAIN_BOX_TOP + (s + e) // 2
-            positions.append(center_y)
-    return positions
-
-
-def click_train(index):
+    return scroll_calibration.service_list.jump_to(offset)
+
+
+def click_train(index, route=None, train_class=None):
     """Click train at the given index (0-based).
 
-    Uses scroll-based positioning instead of border detection:
-    1. Scrolls to the top of the train list
-    2. Scrolls down one box at a time (up to `index` times), checking
-       via frame comparison whether each scroll actually moved the list
-    3. Computes click Y from the number of scrolls that succeeded
-       and a fixed stride, so highlighting can't shift the position
+    Looks the train up in the class's train-list index (built on first
+    use, see train_index.py), jumps the list to it with one verified
+    scroll, and computes the click Y from the measured list position, so
+    highlighting can't shift the position.
     """
     print(f"       Selecting train #{index + 1}...")
 
+    route = route or config.ROUTE_NAME
+    train_class = train_class or config.TRAIN_CLASS
+    entries = train_index.get(route, train_class)
+    if index >= len(entries):
+        raise ValueError(f"Train #{index + 1} requested but '{train_class}' has "
+                         f"{len(entries)} trains")
+    entry = entries[index]
+
+    # Aim for the train at the top of the view, but not past the end of the list
+    list_end = entries[-1].top + entries[-1].height
+    target = max(0, min(entry.top, list_end - config.TRAIN_BOX_HEIGHT))
+    position = scroll_calibration.train_list.jump_to(target)
     click_x = config.TRAIN_BOX_LEFT + config.TRAIN_BOX_WIDTH // 2
-    scroll_x = click_x
-    scroll_y = config.TRAIN_BOX_TOP + config.TRAIN_BOX_HEIGHT // 2
-    region = (config.TRAIN_BOX_LEFT, config.TRAIN_BOX_TOP,
-              config.TRAIN_BOX_WIDTH, config.TRAIN_BOX_HEIGHT)
-
-    # 1. Scroll to the very top for consistent starting position
-    pyautogui.moveTo(scroll_x, scroll_y)
-    time.sleep(0.3)
-    pyautogui.scroll(-config.TRAIN_SCROLL_PER_BOX * 30)
-    time.sleep(1.5)
-
-    # 2. Scroll down one box at a time, verifying each scroll moved
-    scrolls_done = 0
-    for _ in range(index):
-        before = np.array(pyautogui.screenshot(region=region))
-        pyautogui.moveTo(scroll_x, scroll_y)
-        time.sleep(0.3)
-        pyautogui.scroll(config.TRAIN_SCROLL_PER_BOX)
-        time.sleep(1.0)
-        after = np.array(pyautogui.screenshot(region=region))
-
-        if np.mean(np.abs(before.astype(float) - after.astype(float))) < 5.0:
-            print(f"       Scroll stopped after {scrolls_done} (list end reached)")
-            break
-        scrolls_done += 1
-
-    # 3. The target train is at offset (index - scrolls_done) from the top
-    offset = index - scrolls_done
-    click_y = config.TRAIN_BOX_TOP + config.TRAIN_FIRST_Y_OFFSET + offset * config.TRAIN_BOX_STRIDE
-
-    print(f"       Scrolled {scrolls_done}/{index}, offset in view: {offset}, "
-          f"click Y: {click_y}")
+    click_y = config.TRAIN_BOX_TOP + entry.top - position + entry.height // 2
+
+    print(f"       List at {position}px, click Y: {click_y}")
+    baseline = region_signature(config.SERVICE_LIST_REGION)
     pyautogui.moveTo(click_x, click_y)
     time.sleep(0.5)
     pyautogui.mouseDown()
     time.sleep(0.2)
     pyautogui.mouseUp()
-    time.sleep(5.0)           # service list needs time to populate
+    # Service list needs time to populate
+    wait_until_stable(config.SERVICE_LIST_REGION, ceiling=5.0, baseline=baseline)
+    # A newly shown service list starts at the top
+    scroll_calibration.service_list.reset(key=(route, train_class, index))
     print(f"       Train #{index + 1} selected!")
 
 
@@ -235,37 +227,25 @@ def exit_game():
     """
     print("       Exiting game...")
 
-    # 1. Find and click "Exit Game" (button stays visible after click — dialog overlays)
-    exit_refs = [config.REF_EXIT_GAME_1, config.REF_EXIT_GAME_2]
-    clicked = False
-    for ref in exit_refs:
-        if not os.path.isfile(ref):
-            continue
-        if wait_and_click(ref, timeout=10, confidence=config.CONFIDENCE, verify=False):
-            clicked = True
-            break
-    if not clicked:
+    # 1. Find and click "Exit Game" (button stays visible after click — dialog overlays).
+    #    Both variants are checked against each frame.
+    exit_refs = [r for r in (config.REF_EXIT_GAME_1, config.REF_EXIT_GAME_2) if os.path.isfile(r)]
+    if not wait_and_click(exit_refs, timeout=20, confidence=config.CONFIDENCE, verify=False):
         raise TimeoutError("Could not find 'Exit Game' button")
-    time.sleep(2.0)
+    wait_until_stable(ceiling=2.0)
 
     # 2. Wait for the exit confirmation dialog
     print("       Waiting for exit dialog...")
     loc = wait_for_image(config.REF_EXIT_GAME_DIALOGBOX, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE)
     if loc is None:
         raise TimeoutError("Timed out waiting for exit game dialog")
-    time.sleep(1.0)
+    wait_until_stable(ceiling=1.0)
 
     # 3. Click "Yes" to confirm exit
     print("       Clicking 'Yes' to confirm exit...")
-    yes_refs = [config.REF_EXIT_GAME_YES_1, config.REF_EXIT_GAME_YES_2]
-    clicked = False
-    for ref in yes_refs:
-        if not os.path.isfile(ref):
-            continue
-        if wait_and_click(ref, timeout=10, confidence=config.CONFIDENCE):
-            clicked = True
-            break
-    if not clicked:
+    yes_refs = [r for r in (config.REF_EXIT_GAME_YES_1, config.REF_EXIT_GAME_YES_2)
+                if os.path.isfile(r)]
+    if not wait_and_click(yes_refs, timeout=20, confidence=config.CONFIDENCE):
         raise TimeoutError("Could not find 'Yes' button on exit dialog")
 
     # 4. 'Yes' click verify already confirmed the game closed (dialog disappeared).
@@ -274,20 +254,323 @@ def exit_game():
     time.sleep(5.0)
 
 
-def relaunch_and_navigate():
-    """Relaunch the game and navigate back to the train selection screen.
+def open_pause_menu():
+    """Press Escape in a level and wait for the pause menu."""
+    print("       Pressing Escape...")
+    baseline = region_signature()
+    pyautogui.press("escape")
+    wait_until_stable(ceiling=4.0, baseline=baseline)   # pause menu needs time to render
+
+
+def exit_from_pause_menu():
+    """Click 'Exit to Main Menu' on the pause menu and press Enter twice."""
+    print("       Clicking 'Exit to Main Menu'...")
+    if not wait_and_click(config.REF_EXIT_TO_MAIN_MENU, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE):
+        raise TimeoutError("Timed out waiting for 'Exit to Main Menu'")
+    wait_until_stable(ceiling=1.0)
+    print("       Pressing Enter twice...")
+    baseline = region_signature()
+    pyautogui.press("enter")
+    wait_until_stable(ceiling=0.5, baseline=baseline)
+    pyautogui.press("enter")
+    wait_until_stable()
+
+
+def exit_to_main_menu():
+    """Press Escape, find 'Exit to Main Menu', and press Enter twice."""
+    open_pause_menu()
+    exit_from_pause_menu()
+
 
-    Goes through: launch → warning → splash → To The Trains →
-    Choose a Route → route screen → select route → timetable → select class.
+def escape_to_main_menu():
+    """From any in-game menu screen, press Escape until we reach the main menu.
+
+    Checks for the 'To The Trains' tile to confirm we're at the main menu.
+    Used when we're at the service list or class selection and need to get
+    back to the main menu (not from inside a level — use exit_to_main_menu for that).
+    Returns False if the main menu couldn't be confirmed.
+    """
+    for attempt in range(6):
+        # Check if we're already at the main menu
+        loc = matching.locate(config.REF_TO_THE_TRAINS, confidence=config.CONFIDENCE)
+        if loc is not None:
+            print("       At main menu.")
+            return True
+
+        print(f"       Pressing Escape (attempt {attempt + 1})...")
+        baseline = region_signature()
+        pyautogui.press("escape")
+        wait_until_stable(ceiling=2.0, baseline=baseline)
+
+    print("       WARNING: Could not confirm main menu after Escape presses")
+    return False
+
+
+# --- Screen graph ------------------------------------------------------------
+#
+# Where the bot is in the game is a NavState: the screen showing plus the
+# selections it depends on (route, train class, train, service-list scroll
+# offset in pixels).
+# None means "not selected / unknown". Transitions move between screens;
+# Navigator.go_to() plans the cheapest sequence from the current state to a
+# goal with Dijkstra over measured per-transition costs, so steps whose
+# state is already right are never replayed.
+
+NOT_RUNNING = "not_running"
+WARNING = "warning"
+SPLASH = "splash"
+MAIN_MENU = "main_menu"
+TRAINS_MENU = "to_the_trains"
+ROUTE_SELECT = "route_select"
+ROUTE_MENU = "route_menu"
+CLASS_SELECT = "class_select"
+TRAIN_LIST = "train_list"
+SERVICE_LIST = "service_list"
+IN_LEVEL = "in_level"
+PAUSE_MENU = "pause_menu"
+
+# Screens reached from the main menu that Escape walks back out of
+MENU_SCREENS = (TRAINS_MENU, ROUTE_SELECT, ROUTE_MENU, CLASS_SELECT, TRAIN_LIST, SERVICE_LIST)
+
+NavState = collections.namedtuple("NavState", "screen route train_class train offset")
+
+
+def _at(screen, route=None, train_class=None, train=None, offset=None):
+    return NavState(screen, route, train_class, train, offset)
+
+
+# name: (action, default cost in seconds). Actions get the goal NavState and
+# return False if they finished somewhere other than the expected screen.
+TRANSITIONS = {
+    "launch":              (lambda goal: launch_game(), 60.0),
+    "pass_warning":        (lambda goal: pass_warning_screen(), 10.0),
+    "pass_splash":         (lambda goal: pass_splash_screen(), 10.0),
+    "to_the_trains":       (lambda goal: click_to_the_trains(), 4.0),
+    "choose_a_route":      (lambda goal: (click_choose_a_route(), wait_for_route_screen()), 6.0),
+    "select_route":        (lambda goal: select_route(goal.route), 6.0),
+    "timetable":           (lambda goal: click_timetable(), 4.0),
+    "select_class":        (lambda goal: select_train_class(goal.train_class), 7.0),
+    "click_train":         (lambda goal: click_train(goal.train, goal.route, goal.train_class), 8.0),
+    "scroll_to_offset":    (lambda goal: scroll_service_list_to(goal.offset), 3.0),
+    "escape_to_main_menu": (lambda goal: escape_to_main_menu(), 8.0),
+    "pause":               (lambda goal: open_pause_menu(), 3.0),
+    "exit_to_main_menu":   (lambda goal: exit_from_pause_menu(), 10.0),
+    "exit_game":           (lambda goal: exit_game(), 15.0),
+}
+
+
+def _successors(state, goal):
+    """Yield (transition, next NavState) for each move out of `state`.
+
+    Selections are always made with the goal's values, which keeps the
+    search space to the handful of states that can lead to the goal.
+    Leaving a level or the menus forgets every selection, as the game does.
     """
-    print("\n       Relaunching game...")
-    launch_game()
-    pass_warning_screen()
-    pass_splash_screen()
-    click_to_the_trains()
-    click_choose_a_route()
-    wait_for_route_screen()
-    select_route()
-    click_timetable()
-    select_train_class()
-    print("       Back at train list after relaunch.")
+    screen = state.screen
+    if screen == NOT_RUNNING:
+        yield "launch", _at(WARNING)
+    elif screen == WARNING:
+        yield "pass_warning", _at(SPLASH)
+    elif screen == SPLASH:
+        yield "pass_splash", _at(MAIN_MENU)
+    elif screen == MAIN_MENU:
+        yield "to_the_trains", _at(TRAINS_MENU)
+        yield "exit_game", _at(NOT_RUNNING)
+    elif screen == TRAINS_MENU:
+        yield "choose_a_route", _at(ROUTE_SELECT)
+    elif screen == ROUTE_SELECT:
+        yield "select_route", _at(ROUTE_MENU, route=goal.route or config.ROUTE_NAME)
+    elif screen == ROUTE_MENU:
+        yield "timetable", state._replace(screen=CLASS_SELECT)
+    elif screen == IN_LEVEL:
+        yield "pause", _at(PAUSE_MENU)
+    elif screen == PAUSE_MENU:
+        yield "exit_to_main_menu", _at(MAIN_MENU)
+
+    # The class filter, train list and service list share one screen, so a
+    # class or train can be picked from any of them without backing out
+    if screen in (CLASS_SELECT, TRAIN_LIST, SERVICE_LIST):
+        train_class = goal.train_class or config.TRAIN_CLASS
+        if screen == CLASS_SELECT or state.train_class != train_class:
+            yield "select_class", state._replace(screen=TRAIN_LIST, train_class=train_class,
+                                                 train=None, offset=None)
+    if screen in (TRAIN_LIST, SERVICE_LIST) and goal.train is not None:
+        if screen == TRAIN_LIST or state.train != goal.train:
+            yield "click_train", state._replace(screen=SERVICE_LIST, train=goal.train, offset=0)
+    if (screen == SERVICE_LIST and goal.offset is not None and state.offset is not None
+            and state.offset != goal.offset):
+        yield "scroll_to_offset", state._replace(offset=goal.offset)
+
+    if screen in MENU_SCREENS:
+        yield "escape_to_main_menu", _at(MAIN_MENU)
+
+
+def _satisfies(state, goal):
+    """True if `state` is the goal screen with every selection the goal asks for."""
+    screens = (SERVICE_LIST, TRAIN_LIST) if state.screen == SERVICE_LIST else (state.screen,)
+    if goal.screen not in screens:
+        return False
+    return all(want is None or want == have for want, have in zip(goal[1:], state[1:]))
+
+
+def _screen_candidates():
+    """Reference variants that identify each screen, for Navigator.identify()."""
+    refs = {
+        WARNING: [config.REF_WARNING_CONTINUE],
+        SPLASH: [config.REF_SPLASH_CONTINUE],
+        MAIN_MENU: [config.REF_TO_THE_TRAINS],
+        TRAINS_MENU: [config.REF_CHOOSE_A_ROUTE],
+        ROUTE_SELECT: [config.REF_CHOOSE_A_ROUTE_SCREEN],
+        ROUTE_MENU: [config.REF_TIMETABLE],
+        CLASS_SELECT: [config.REF_CLASS_FILTER],
+        PAUSE_MENU: [config.REF_EXIT_TO_MAIN_MENU],
+    }
+    return {screen: [r for r in paths if os.path.isfile(r)] for screen, paths in refs.items()}
+
+
+class Navigator:
+    """Tracks which screen the game is on and walks the screen graph.
+
+    Transition costs are an exponential moving average of how long each
+    transition actually took, kept in state/transition_costs.json and
+    written every TRANSITION_COSTS_FLUSH_EVERY transitions and at exit.
+    """
+
+    def __init__(self, state=None):
+        self.state = state if state is not None else _at(NOT_RUNNING)
+        self._costs = None
+        self._unsaved = 0   # transitions recorded since the costs were last written
+        atexit.register(self.flush)
+
+    def _load_costs(self):
+        if self._costs is None:
+            self._costs = {}
+            if os.path.isfile(config.TRANSITION_COSTS_PATH):
+                try:
+                    with open(config.TRANSITION_COSTS_PATH) as f:
+                        self._costs = json.load(f)
+                except (OSError, ValueError):
+                    print("       WARNING: Ignoring unreadable transition costs")
+        return self._costs
+
+    def cost(self, name):
+        """Expected seconds for a transition: measured if known, else the default."""
+        return self._load_costs().get(name, TRANSITIONS[name][1])
+
+    def _record(self, name, seconds):
+        costs = self._load_costs()
+        previous = costs.get(name)
+        if previous is None:
+            costs[name] = round(seconds, 2)
+        else:
+            alpha = config.TRANSITION_COST_SMOOTHING
+            costs[name] = round(previous + alpha * (seconds - previous), 2)
+        self._unsaved += 1
+        if self._unsaved >= config.TRANSITION_COSTS_FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Write any recorded transition costs that haven't been saved yet."""
+        if self._unsaved:
+            os.makedirs(os.path.dirname(config.TRANSITION_COSTS_PATH), exist_ok=True)
+            with open(config.TRANSITION_COSTS_PATH, "w") as f:
+                json.dump(self._costs, f, indent=2)
+            self._unsaved = 0
+
+    def mark(self, screen, **selections):
+        """Record that the bot moved to `screen` by means outside the graph
+        (e.g. loading a service). Selections not given are kept from the
+        current state on the same screen family, otherwise cleared.
+        """
+        if screen is None:
+            self.state = None
+            return
+        current = self.state or _at(screen)
+        keep = screen in (TRAIN_LIST, SERVICE_LIST) and current.screen in (TRAIN_LIST, SERVICE_LIST)
+        base = current._replace(screen=screen) if keep else _at(screen)
+        self.state = base._replace(**selections)
+
+    def identify(self):
+        """Work out which screen is showing from the reference images.
+
+        Selections are unknown afterwards. Returns the screen name, or None
+        if no screen matched.
+        """
+        frame, _ = capture.get_frame(since=time.time())
+        hit = matching.classify(_screen_candidates(), frame, confidence=config.CONFIDENCE_LOW,
+                                exhaustive=True, mode=config.MATCH_MODE)
+        if hit is None:
+            self.state = None
+            return None
+        print(f"       Identified screen: {hit.state}")
+        self.state = _at(hit.state)
+        return hit.state
+
+    def plan(self, goal):
+        """Return (transitions, expected seconds) for the cheapest path to `goal`.
+
+        transitions is a list of (name, NavState reached); (None, None) if
+        the goal can't be reached from the current state.
+        """
+        counter = itertools.count()
+        queue = [(0.0, next(counter), self.state, [])]
+        best = {self.state: 0.0}
+        while queue:
+            cost, _, state, path = heapq.heappop(queue)
+            if _satisfies(state, goal):
+                return path, cost
+            if cost > best[state]:
+                continue
+            for name, nxt in _successors(state, goal):
+                total = cost + self.cost(name)
+                if total < best.get(nxt, float("inf")):
+                    best[nxt] = total
+                    heapq.heappush(queue, (total, next(counter), nxt, path + [(name, nxt)]))
+        return None, None
+
+    def go_to(self, screen, route=None, train_class=None, train=None, offset=None):
+        """Navigate to `screen` with the given selections, by the cheapest path.
+
+        Route and class default to config.ROUTE_NAME / TRAIN_CLASS on the
+        screens that need them; the service list defaults to offset 0.
+        """
+        if screen in (ROUTE_MENU, CLASS_SELECT, TRAIN_LIST, SERVICE_LIST):
+            route = route or config.ROUTE_NAME
+        if screen in (TRAIN_LIST, SERVICE_LIST):
+            train_class = train_class or config.TRAIN_CLASS
+        if screen == SERVICE_LIST and offset is None:
+            offset = 0
+        goal = _at(screen, route, train_class, train, offset)
+
+        for _ in range(3):
+            if self.state is None and self.identify() is None:
+                raise TimeoutError("Could not tell which screen the game is showing")
+            path, expected = self.plan(goal)
+            if path is None:
+                raise TimeoutError(f"No way to reach '{screen}' from '{self.state.screen}'")
+            if path:
+                print(f"       Navigating {self.state.screen} -> {screen}: "
+                      f"{' -> '.join(name for name, _ in path)} (~{expected:.0f}s)")
+            if all(self._run(name, goal, target) for name, target in path):
+                if self.state.screen in (TRAIN_LIST, SERVICE_LIST):
+                    health.monitor.mark_steady()
+                return
+        raise TimeoutError(f"Could not navigate to '{screen}'")
+
+    def _run(self, name, goal, target):
+        """Run one transition. Returns False if it ended off the planned screen."""
+        action, _ = TRANSITIONS[name]
+        self.state = None   # unknown until the action completes
+        started = time.time()
+        if action(goal) is False:
+            return False
+        seconds = time.time() - started
+        self._record(name, seconds)
+        health.monitor.record_transition(name, seconds)
+        watchdog.progress()
+        self.state = target
+        return True
+
+
+# The bot drives a single game, so one navigator is shared by every module
+nav = Navigator()
@@ -1,12 +1,16 @@
 import os
 import time
 
+import cv2
 import numpy as np
-import pyautogui
 from PIL import Image
 
+import borders
+import capture
 import config
-from utils import wait_and_click
+import frame_compare
+import matching
+from utils import region_signature, wait_and_click, wait_until_stable
 
 SCHEDULE_MAX_WIDTH = 1470
 SEPARATOR_RGB = np.array([0x13, 0x2c, 0x39])  # #132c39 — dark line between blocks
@@ -18,149 +22,228 @@ BOX_COLORS = [
     np.array(config.SCHEDULE_TOP_BORDER_RGB),       # #059744 (green)
 ]
 
+# Row labels (see classify_rows)
+ROW_OTHER = 0
+ROW_SEPARATOR = 1
+ROW_LIGHT_BOX = 2
+ROW_GREEN_BOX = 3
+
 
 def capture_schedule_region():
-    """Capture the schedule area as a numpy array (RGB)."""
+    """Capture the schedule area as a numpy array (RGB).
+
+    Returns a copy, since the last frame is kept for the next join and a
+    view would keep the whole desktop frame alive.
+    """
     region = (
         config.SCHEDULE_LEFT,
         config.SCHEDULE_TOP,
         config.SCHEDULE_RIGHT - config.SCHEDULE_LEFT,
         config.SCHEDULE_BOTTOM - config.SCHEDULE_TOP,
     )
-    screenshot = pyautogui.screenshot(region=region)
-    return np.array(screenshot)
+    return capture.get_region(region, since=time.time()).copy()
+
+
+def _band_difference(a, b, ignore_rows=0):
+    """Mean absolute difference between two equal-sized strips.
+
+    With `ignore_rows`, that many of the most different rows are left out,
+    so a small local change between grabs (a blinking clock) doesn't fail
+    an otherwise exact match.
+    """
+    per_row = cv2.absdiff(a, b).mean(axis=(1, 2))
+    if ignore_rows:
+        per_row = np.sort(per_row)[:-ignore_rows]
+    return float(per_row.mean())
 
 
 def find_overlap(prev_img, curr_img, band_height=40):
     """Find overlap between two frames using a template-match approach.
 
     Takes a narrow horizontal band from the top of curr_img and searches
-    for its position in prev_img. The overlap is (prev_height - match_row).
-    Returns the number of rows to skip from the top of curr_img, or 0.
+    for its position in prev_img. The search is coarse-to-fine: one
+    cv2.matchTemplate pass over uint8 row signatures (each row averaged
+    down to every SCHEDULE_OVERLAP_COLUMN_STEP-th column, so no row is
+    lost) shortlists the rows, and the best few are compared at full
+    resolution over the whole band. The overlap is
+    (prev_height - match_row + band_start).
+
+    Returns (overlap, diff): the number of rows to skip from the top of
+    curr_img, and the mean absolute difference at the best row, leaving
+    out its SCHEDULE_OVERLAP_IGNORE_ROWS worst rows. The overlap is 0 if
+    that difference is above SCHEDULE_OVERLAP_MAX_DIFF.
     """
     h = prev_img.shape[0]
+    if h <= band_height or prev_img.shape[1:] != curr_img.shape[1:]:
+        return 0, float("inf")
 
     # Take a band from the top area of the new frame (skip first few rows
     # in case of edge artifacts)
     band_start = 5
-    band = curr_img[band_start:band_start + band_height, :, :].astype(float)
-
-    # Slide the band down through prev_img looking for a match
-    best_row = -1
-    best_diff = float("inf")
-
-    for row in range(0, h - band_height):
-        strip = prev_img[row:row + band_height, :, :].astype(float)
-        diff = np.mean(np.abs(strip - band))
+    band = curr_img[band_start:band_start + band_height]
+
+    width = max(1, prev_img.shape[1] // config.SCHEDULE_OVERLAP_COLUMN_STEP)
+    prev_sig = cv2.resize(prev_img, (width, h), interpolation=cv2.INTER_AREA)
+    band_sig = cv2.resize(band, (width, band_height), interpolation=cv2.INTER_AREA)
+    sqdiff = cv2.matchTemplate(prev_sig, band_sig, cv2.TM_SQDIFF)[:, 0]
+
+    # Rows that look alike in signature (e.g. plain box colour) are told
+    # apart at full resolution; ties go to the topmost row
+    shortlist = np.sort(np.argsort(sqdiff, kind="stable")[:config.SCHEDULE_OVERLAP_CANDIDATES])
+    best_row, best_diff = -1, float("inf")
+    for row in shortlist:
+        diff = _band_difference(prev_img[row:row + band_height], band)
         if diff < best_diff:
-            best_diff = diff
-            best_row = row
+            best_row, best_diff = int(row), diff
 
-    if best_diff < 5.0:
-        overlap = h - best_row + band_start
-        return overlap
+    diff = _band_difference(prev_img[best_row:best_row + band_height], band,
+                            ignore_rows=config.SCHEDULE_OVERLAP_IGNORE_ROWS)
+    if diff > config.SCHEDULE_OVERLAP_MAX_DIFF:
+        return 0, diff
+    return h - best_row + band_start, diff
 
-    return 0
 
+def classify_rows(img):
+    """Label every row of a schedule image (ROW_* constants), in one pass.
 
-def is_separator_row(img, row):
-    """Check if a row in the image is a dark separator line (#132c39)."""
+    A row takes a colour's label when more than 30% of its middle 80%
+    is that colour. Separators win over box colours.
+    """
     w = img.shape[1]
-    left = w // 10
-    right = w - w // 10
-    pixels = img[row, left:right, :].astype(int)
-    match = np.all(np.abs(pixels - SEPARATOR_RGB) <= SEPARATOR_TOL, axis=1)
-    return np.mean(match) > 0.3
+    strip = img[:, w // 10:w - w // 10, :]
+    tol = config.SCHEDULE_COLOR_TOLERANCE
+    labels = np.full(img.shape[0], ROW_OTHER, dtype=np.uint8)
+    for label, rgb, label_tol in ((ROW_LIGHT_BOX, BOX_COLORS[0], tol),
+                                  (ROW_GREEN_BOX, BOX_COLORS[1], tol),
+                                  (ROW_SEPARATOR, SEPARATOR_RGB, SEPARATOR_TOL)):
+        labels[borders.rows_with_color(strip, rgb, label_tol, min_share=0.3)] = label
+    return labels
 
 
-def find_nearest_separator(img, target_row, search_range=50):
+def find_nearest_separator(labels, target_row, search_range=50):
     """Find the nearest separator row to target_row, searching up and down.
 
-    Returns the first row of the separator, or target_row if none found.
+    `labels` comes from classify_rows. Of two rows equally close, the one
+    above wins. Returns the row, or target_row if none is within range.
     """
-    h = img.shape[0]
-    for offset in range(search_range):
-        for row in [target_row - offset, target_row + offset]:
-            if 0 <= row < h and is_separator_row(img, row):
-                return row
-    return target_row
+    rows = np.flatnonzero(labels == ROW_SEPARATOR)
+    distance = np.abs(rows - target_row)
+    in_range = distance < search_range
+    if not np.any(in_range):
+        return target_row
+    rows, distance = rows[in_range], distance[in_range]
+    return int(rows[np.lexsort((rows > target_row, distance))[0]])
 
 
-def find_separator_end(img, sep_row):
+def find_separator_end(labels, sep_row):
     """Find the last row of a separator starting at sep_row.
 
-    Walks downward while rows still match the separator color.
     Returns the row index just past the separator.
     """
-    h = img.shape[0]
-    row = sep_row
-    while row < h and is_separator_row(img, row):
-        row += 1
-    return row
+    rest = np.flatnonzero(labels[sep_row:] != ROW_SEPARATOR)
+    return sep_row + int(rest[0]) if rest.size else labels.shape[0]
 
 
-def stitch_images(images):
-    """Stitch schedule frames, cutting at dark separator lines.
+class ScheduleStitcher:
+    """Stitches schedule frames as they are captured, cutting at dark separator lines.
+
+    Each added frame is joined to the previous one straight away: pixel
+    overlap finds where the frames overlap, then the cut point snaps to
+    the nearest #132c39 separator so the join is invisible. The result
+    keeps through the end of the separator; the new frame starts after
+    it. Rows are written straight into a canvas, so only the last frame
+    is kept besides the output.
 
-    Uses pixel overlap to find where frames overlap, then snaps the
-    cut point to the nearest #132c39 separator so the join is invisible.
-    Result keeps through the end of the separator; new frame starts after it.
+    With `max_rows` (an upper bound on the stitched height, e.g. frames x
+    frame height) the canvas is allocated once up front; pages that are
+    never written are never touched. Otherwise it doubles when full.
     """
-    if not images:
-        return None
-    if len(images) == 1:
-        return Image.fromarray(images[0])
-
-    result = images[0]
-
-    for i in range(1, len(images)):
-        overlap = find_overlap(images[i - 1], images[i])
-        if overlap > 0:
-            # Find the nearest separator in the new frame
-            sep_start = find_nearest_separator(images[i], overlap)
-            print(f"       Frame {i-1} → {i}: overlap={overlap}px, "
-                  f"separator at row {sep_start}")
-
-            # New frame starts FROM the separator (keeps the dark line)
-            new_part = images[i][sep_start:, :, :]
-
-            # Trim result to the matching separator (also keeps the dark line)
-            # They overlap on the dark pixels — invisible join
-            prev_sep = result.shape[0] - overlap + sep_start
-            prev_sep = find_nearest_separator(result, prev_sep)
-            result = result[:prev_sep, :, :]
+
+    def __init__(self, max_rows=None):
+        self.max_rows = max_rows
+        self.canvas = None
+        self.labels = None    # classify_rows labels of the canvas rows
+        self.height = 0       # rows of the canvas in use
+        self.last = None      # the most recently added frame
+        self.frames = 0
+
+    def _write(self, rows, labels):
+        needed = self.height + rows.shape[0]
+        if self.canvas is None or needed > self.canvas.shape[0]:
+            capacity = self.max_rows or max(needed, 2 * self.height, 4 * rows.shape[0])
+            capacity = max(capacity, needed)
+            canvas = np.empty((capacity,) + rows.shape[1:], dtype=np.uint8)
+            grown = np.empty(capacity, dtype=np.uint8)
+            if self.canvas is not None:
+                canvas[:self.height] = self.canvas[:self.height]
+                grown[:self.height] = self.labels[:self.height]
+            self.canvas, self.labels = canvas, grown
+        self.canvas[self.height:needed] = rows
+        self.labels[self.height:needed] = labels
+        self.height = needed
+
+    def add(self, frame):
+        """Join a frame onto the end of the schedule."""
+        labels = classify_rows(frame)
+        if self.last is None:
+            new_part = frame
         else:
-            print(f"       Frame {i-1} → {i}: no overlap found, appending full frame")
-            new_part = images[i]
+            i = self.frames
+            overlap, diff = find_overlap(self.last, frame)
+            if overlap > 0:
+                # Find the nearest separator in the new frame
+                sep_start = find_nearest_separator(labels, overlap)
+                print(f"       Frame {i-1} → {i}: overlap={overlap}px (diff {diff:.1f}), "
+                      f"separator at row {sep_start}")
+
+                # New frame starts FROM the separator (keeps the dark line)
+                new_part = frame[sep_start:, :, :]
+                labels = labels[sep_start:]
+
+                # Trim result to the matching separator (also keeps the dark line)
+                # They overlap on the dark pixels — invisible join
+                prev_sep = self.height - overlap + sep_start
+                prev_sep = find_nearest_separator(self.labels[:self.height], prev_sep)
+                self.height = min(prev_sep, self.height)
+            else:
+                print(f"       Frame {i-1} → {i}: no overlap found (best diff {diff:.1f}), "
+                      f"appending full frame")
+                new_part = frame
 
         if new_part.shape[0] > 0:
-            result = np.vstack([result, new_part])
+            self._write(new_part, labels)
+        self.last = frame
+        self.frames += 1
+
+    def result(self):
+        """Return (image, labels) of the schedule so far, or (None, None) if empty."""
+        if self.frames == 0:
+            return None, None
+        return self.canvas[:self.height], self.labels[:self.height]
 
-    return Image.fromarray(result)
 
+def stitch_images(images):
+    """Stitch a list of schedule frames (see ScheduleStitcher). Returns a PIL Image."""
+    if not images:
+        return None
+    stitcher = ScheduleStitcher()
+    for image in images:
+        stitcher.add(image)
+    return Image.fromarray(stitcher.result()[0])
 
-def crop_schedule(img):
+
+def crop_schedule(img, labels=None):
     """Crop the stitched schedule: trim below the last box and cap width.
 
-    Scans from the bottom up to find the last row that matches either box
-    color (#c5e4e9 or #059744), then crops everything below it.
+    Finds the last row labelled with either box color (#c5e4e9 or
+    #059744) and crops everything below it. `labels` is the image's
+    classify_rows result, computed if not given.
     Also limits width to SCHEDULE_MAX_WIDTH pixels from the left.
     """
-    tol = config.SCHEDULE_COLOR_TOLERANCE
-    w = img.shape[1]
-    left = w // 10
-    right = w - w // 10
-    strip = img[:, left:right, :].astype(int)
-
-    last_box_row = img.shape[0]
-    for row in range(strip.shape[0] - 1, -1, -1):
-        for color in BOX_COLORS:
-            match = np.all(np.abs(strip[row] - color) <= tol, axis=1)
-            if np.mean(match) > 0.3:
-                last_box_row = row + 1
-                break
-        if last_box_row < img.shape[0]:
-            break
+    if labels is None:
+        labels = classify_rows(img)
+    box_rows = np.flatnonzero((labels == ROW_LIGHT_BOX) | (labels == ROW_GREEN_BOX))
+    last_box_row = int(box_rows[-1]) + 1 if box_rows.size else img.shape[0]
 
     img = img[:last_box_row, :min(img.shape[1], SCHEDULE_MAX_WIDTH), :]
     return img
@@ -168,81 +251,139 @@ def crop_schedule(img):
 
 def scroll_schedule_down(amount=-2000):
     """Scroll the schedule area down."""
+    import pyautogui  # imported lazily so stitching loads without a display
     center_x = (config.SCHEDULE_LEFT + config.SCHEDULE_RIGHT) // 2
     center_y = (config.SCHEDULE_TOP + config.SCHEDULE_BOTTOM) // 2
     pyautogui.moveTo(center_x, center_y)
     time.sleep(0.3)
+    baseline = region_signature(config.SCHEDULE_REGION)
     pyautogui.scroll(amount)
-    time.sleep(2.0)
+    # Let the scroll finish; at the end of the list nothing moves and this
+    # runs to the ceiling
+    wait_until_stable(config.SCHEDULE_REGION, ceiling=2.0, baseline=baseline)
 
 
 def frames_match(a, b, threshold=5.0):
-    """Check if two frames are nearly identical (scroll didn't move)."""
-    if a.shape != b.shape:
-        return False
-    diff = np.mean(np.abs(a.astype(float) - b.astype(float)))
-    return diff < threshold
+    """Check if two frames are nearly identical (scroll didn't move).
 
+    Compares compact signatures of the frames, stopping as soon as the
+    answer is clear (see frame_compare.py). Returns a Comparison; its
+    `same` is the answer.
+    """
+    return frame_compare.compare(frame_compare.signature(a), frame_compare.signature(b),
+                                 threshold)
 
-def capture_schedule(output_dir):
-    """Capture the full schedule by scrolling and stitching.
 
-    Presses Escape, clicks Schedule, captures frames, stitches them,
-    and saves the result as schedule.png in output_dir.
+def open_schedule():
+    """From gameplay, press Escape and open the pause menu's Schedule page.
 
-    Returns the path to the saved schedule image, or None on failure.
+    No settle wait after Escape: the 'Schedule' wait polls until the pause
+    menu has rendered. Returns False if 'Schedule' never appeared.
     """
-    # Press Escape to open pause menu
+    import pyautogui
     print("       Pressing Escape for schedule...")
     pyautogui.press("escape")
-    time.sleep(4.0)
 
-    # Click 'Schedule'
     print("       Clicking 'Schedule'...")
+    baseline = region_signature(config.SCHEDULE_REGION)
     if not wait_and_click(config.REF_SCHEDULE, timeout=config.SCREEN_TIMEOUT,
                           confidence=config.CONFIDENCE):
         print("       ERROR: Could not find 'Schedule' on screen")
-        return None
-    time.sleep(3.0)
+        return False
+    wait_until_stable(config.SCHEDULE_REGION, ceiling=3.0, baseline=baseline)
+    return True
+
+
+def _pause_menu_candidates():
+    """References that tell which pause-menu page is showing."""
+    return {
+        "exit": [config.REF_EXIT_TO_MAIN_MENU],   # page with 'Exit to Main Menu'
+        "pause": [config.REF_SCHEDULE],           # pause menu, exit button not matched
+    }
+
+
+def close_schedule():
+    """Close the schedule and leave the game on the pause menu.
+
+    Escape from the schedule lands either on the pause menu or back in
+    gameplay. Which one is read from the settled screen, so Escape is only
+    pressed a second time when gameplay is showing. Returns the state found:
+    "exit", "pause" or "gameplay".
+    """
+    import pyautogui
+    baseline = region_signature()
+    pyautogui.press("escape")
+    wait_until_stable(ceiling=2.0, baseline=baseline)
+
+    hit = matching.classify(_pause_menu_candidates(), confidence=config.CONFIDENCE,
+                            mode=config.MATCH_MODE)
+    state = hit.state if hit is not None else "gameplay"
+    print(f"       Schedule closed — now at: {state}")
+    if state == "gameplay":
+        print("       Pressing Escape for pause menu...")
+        pyautogui.press("escape")
+    return state
+
 
+def save_schedule(output_dir):
+    """Capture the open schedule by scrolling and stitching.
+
+    Frames are stitched as they are captured, so the schedule is ready as
+    soon as the end of the scroll is reached. Saves the result as
+    2_schedule.png in output_dir. Returns the path to the saved schedule
+    image, or None on failure.
+    """
     # Capture frames by scrolling
     print("       Capturing schedule frames...")
-    frames = []
     max_frames = 20
+    stitcher = ScheduleStitcher(max_rows=max_frames * config.SCHEDULE_REGION[3])
 
     for frame_idx in range(max_frames):
         img = capture_schedule_region()
 
         # Detect end of scroll: compare with previous frame
-        if frames and frames_match(frames[-1], img):
-            print(f"       Frame {frame_idx} matches previous — end of scroll")
-            break
+        if stitcher.last is not None:
+            match = frames_match(stitcher.last, img)
+            if match.same:
+                print(f"       Frame {frame_idx} matches previous — end of scroll "
+                      f"(confidence {match.confidence:.3f})")
+                break
 
-        frames.append(img)
+        stitcher.add(img)
         print(f"       Frame {frame_idx} captured")
 
         # Scroll down for next frame
         scroll_schedule_down()
 
-    print(f"       Captured {len(frames)} frames, stitching...")
-
-    # Stitch frames together
-    stitched = stitch_images(frames)
-    if stitched is None:
+    stitched_arr, labels = stitcher.result()
+    if stitched_arr is None:
         print("       ERROR: No frames to stitch")
         return None
+    print(f"       Stitched {stitcher.frames} frames")
 
     # Crop: trim below last box, cap width
-    stitched_arr = crop_schedule(np.array(stitched))
+    stitched_arr = crop_schedule(stitched_arr, labels)
     stitched = Image.fromarray(stitched_arr)
     print(f"       Cropped to {stitched_arr.shape[0]}x{stitched_arr.shape[1]}")
 
     output_path = os.path.join(output_dir, "2_schedule.png")
     stitched.save(output_path)
     print(f"       Saved schedule: {output_path}")
+    return output_path
 
-    # Close schedule (press Escape)
-    pyautogui.press("escape")
-    time.sleep(2.0)
 
-    return output_path
+def capture_schedule(output_dir):
+    """Open the schedule from gameplay, save it, and close it.
+
+    Once the schedule is open, leaves the game on the pause menu (ready
+    for 'Exit to Main Menu') whether or not the capture worked. If it
+    can't be opened, returns straight away with the screen unknown, so
+    callers should have the navigator identify it after a failure.
+    Returns the path to the saved schedule image, or None on failure.
+    """
+    if not open_schedule():
+        return None
+    try:
+        return save_schedule(output_dir)
+    finally:
+        close_schedule()
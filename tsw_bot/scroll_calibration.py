@@ -0,0 +1,451 @@
+"""Measured scrolling for the service and train lists.
+
+Every scroll grabs the list region before and after, and the distance
+the content actually moved is found by cross-correlating a textured band
+of one grab against the other. Each list tracks its scroll position in
+pixels from that measured movement, so a scroll that lands short or long
+is corrected by the next one instead of accumulating drift. Scroll-wheel
+clicks per pixel are learned from the same measurements and kept in
+state/scroll_calibration.json (written every SCROLL_CALIBRATION_FLUSH_EVERY
+measurements and at exit):
+    {"<list>": {"clicks_per_px": float, "samples": int}}
+
+Boxes seen at a measured position are remembered, so a long move can be
+made as one calibrated gesture (jump_to) and its landing verified by
+finding a remembered box where it should be.
+
+Run a calibration pass while the game shows a service list with the
+train list beside it:
+    python scroll_calibration.py [--steps N] [service] [train]
+"""
+import argparse
+import atexit
+import json
+import os
+import time
+
+import cv2
+import numpy as np
+import pyautogui
+
+import capture
+import config
+from utils import region_signature, wait_until_stable
+
+_calibration = None
+_unsaved = 0   # measurements learned since the calibration was last written
+
+
+class ScrollLost(TimeoutError):
+    """A list couldn't be followed to its end: a scroll couldn't be
+    measured, or the end never came. A TimeoutError, so the watchdog
+    recovers and retries the work."""
+
+
+def _load():
+    global _calibration
+    if _calibration is None:
+        _calibration = {}
+        if os.path.isfile(config.SCROLL_CALIBRATION_PATH):
+            try:
+                with open(config.SCROLL_CALIBRATION_PATH) as f:
+                    _calibration = json.load(f)
+            except (OSError, ValueError):
+                print("       WARNING: Ignoring unreadable scroll calibration")
+    return _calibration
+
+
+def _save():
+    global _unsaved
+    os.makedirs(os.path.dirname(config.SCROLL_CALIBRATION_PATH), exist_ok=True)
+    with open(config.SCROLL_CALIBRATION_PATH, "w") as f:
+        json.dump(_calibration, f, indent=2)
+    _unsaved = 0
+
+
+def flush():
+    """Write any learned calibration that hasn't been saved yet."""
+    if _unsaved:
+        _save()
+
+
+atexit.register(flush)
+
+
+def _textured_band(gray, band):
+    """Return the top row of the first band (from the top) with enough texture to match."""
+    limit = gray.shape[0] - band
+    for top in range(0, max(1, limit // 2), band // 2):
+        if gray[top:top + band].std() >= config.SCROLL_MATCH_MIN_STD:
+            return top
+    return None
+
+
+def measure_displacement(before, after, band=config.SCROLL_MATCH_BAND):
+    """Return (pixels, score): how far the list content moved between two grabs.
+
+    Positive pixels means the content moved up (the list scrolled down).
+    A textured band of each grab is searched for in the other, covering
+    both directions, then a half-height band, which still matches when an
+    overshooting scroll left less overlap than planned. A band match is
+    only a candidate: in a list of look-alike boxes it can land a box
+    away, so the first candidate whose whole overlap agrees (see
+    _overlap_agrees) wins. Returns (None, score) if no candidate holds
+    up, e.g. the list moved further than the region is tall.
+    """
+    a = cv2.cvtColor(before, cv2.COLOR_RGB2GRAY)
+    b = cv2.cvtColor(after, cv2.COLOR_RGB2GRAY)
+    if a.shape != b.shape:
+        return None, 0.0
+    best_score = 0.0
+    for size in (band, band // 2) if band >= 16 else (band,):
+        for shift, score in _match_shift(a, b, size):
+            best_score = max(best_score, score)
+            if score >= config.SCROLL_MATCH_MIN_SCORE and _overlap_agrees(a, b, shift, size):
+                return shift, score
+    return None, best_score
+
+
+def _match_shift(a, b, band):
+    """Return candidate (shift, score) pairs from one band size, best first."""
+    if a.shape[0] <= band:
+        return []
+
+    candidates = []
+    # Scrolled down: a band near the top of `after` is further down in `before`;
+    # scrolled up: the same with the grabs swapped
+    for needle_img, haystack, sign in ((b, a, 1), (a, b, -1)):
+        top = _textured_band(needle_img, band)
+        if top is None:
+            continue
+        result = cv2.matchTemplate(haystack, needle_img[top:top + band], cv2.TM_CCOEFF_NORMED)
+        _, score, _, (_, y) = cv2.minMaxLoc(result)
+        candidates.append((sign * (y - top), float(score)))
+    return sorted(candidates, key=lambda c: -c[1])
+
+
+def _overlap_agrees(a, b, shift, min_rows):
+    """True if the grabs agree over everything they share when offset by `shift`."""
+    rows = a.shape[0] - abs(shift)
+    if rows < min_rows:
+        return False
+    if shift >= 0:
+        a, b = a[shift:], b[:rows]
+    else:
+        a, b = a[:rows], b[-shift:]
+    return cv2.absdiff(a, b).mean() <= config.SCROLL_CONFIRM_MAX_DIFF
+
+
+class ScrollTracker:
+    """Scroll position of one list, in pixels from its top.
+
+    `default_clicks_per_box` (a config constant) seeds the calibration
+    until measurements replace it.
+    """
+
+    def __init__(self, name, region, stride, default_clicks_per_box):
+        self.name = name
+        self.region = region
+        self.stride = stride
+        self.default_clicks_per_box = default_clicks_per_box
+        self.position = 0
+        self.key = None
+        self.landmarks = {}   # list index -> grayscale crop of that box's stride
+        left, top, width, height = region
+        self.center = (left + width // 2, top + height // 2)
+        # Largest whole-box scroll that leaves enough overlap to be measured
+        usable = height - config.SCROLL_MATCH_BAND - config.SCROLL_MATCH_MARGIN
+        self.page_step = max(1, usable // stride) * stride
+
+    def clicks_per_px(self):
+        entry = _load().get(self.name)
+        if entry is None:
+            return self.default_clicks_per_box / self.stride
+        return entry["clicks_per_px"]
+
+    def _learn(self, clicks, moved, requested):
+        """Fold one measured scroll into the calibration.
+
+        Scrolls cut short by the end of the list (or far off the request)
+        say nothing about the wheel ratio and are ignored.
+        """
+        global _unsaved
+        if moved == 0 or abs(requested) < self.stride // 2:
+            return
+        if abs(moved - requested) > abs(requested) * 0.25:
+            return
+        ratio = clicks / moved
+        calibration = _load()
+        entry = calibration.get(self.name)
+        if entry is None:
+            entry = {"clicks_per_px": ratio, "samples": 0}
+        else:
+            alpha = config.SCROLL_CALIBRATION_SMOOTHING
+            entry["clicks_per_px"] += alpha * (ratio - entry["clicks_per_px"])
+        entry["samples"] += 1
+        calibration[self.name] = entry
+        _unsaved += 1
+        if _unsaved >= config.SCROLL_CALIBRATION_FLUSH_EVERY:
+            _save()
+
+    def _grab(self):
+        return capture.get_region(self.region, since=time.time()).copy()
+
+    def reset(self, position=0, key=None):
+        """Record the list's position without scrolling (e.g. a fresh list starts at the top).
+
+        `key` identifies the list's contents (e.g. which train's services);
+        remembered boxes are dropped when it changes. None keeps the
+        current key.
+        """
+        self.position = position
+        if key is not None and key != self.key:
+            self.key = key
+            self.landmarks = {}
+
+    def _remember(self, gray, position=None):
+        """Remember every whole box in a grayscale image of the list.
+
+        `position` is the list offset of the image's first row (default:
+        the current position, for a grab of the region).
+        """
+        if position is None:
+            position = self.position
+        for index in range(max(0, -(-position // self.stride)), 10 ** 6):
+            top = index * self.stride - position
+            if top + self.stride > gray.shape[0]:
+                break
+            crop = gray[top:top + self.stride]
+            if crop.std() >= config.SCROLL_MATCH_MIN_STD:
+                self.landmarks[index] = crop.copy()
+
+    def _expected_landmarks(self, position):
+        """Remembered box indices that should be fully visible at `position`, top first."""
+        height = self.region[3]
+        return sorted(index for index in self.landmarks
+                      if 0 <= index * self.stride - position <= height - self.stride)
+
+    def locate(self, gray, expected_position):
+        """Return the list position implied by finding remembered boxes in `gray`.
+
+        Each box is first searched for within half a stride of where it
+        should be (so look-alike neighbours can't be confused), then the
+        top one across the whole grab. Returns None if none is found.
+        """
+        candidates = self._expected_landmarks(expected_position)
+        slack = self.stride // 2 - 1
+        for index in candidates[:3]:
+            expected_top = index * self.stride - expected_position
+            top = max(0, expected_top - slack)
+            bottom = min(gray.shape[0], expected_top + self.stride + slack)
+            window = gray[top:bottom]
+            if window.shape[0] < self.stride:
+                continue
+            result = cv2.matchTemplate(window, self.landmarks[index], cv2.TM_CCOEFF_NORMED)
+            _, score, _, (_, y) = cv2.minMaxLoc(result)
+            if score >= config.SCROLL_MATCH_MIN_SCORE:
+                return index * self.stride - (top + y)
+        for index in candidates[:1]:
+            result = cv2.matchTemplate(gray, self.landmarks[index], cv2.TM_CCOEFF_NORMED)
+            _, score, _, (_, y) = cv2.minMaxLoc(result)
+            if score >= config.SCROLL_MATCH_MIN_SCORE:
+                return index * self.stride - y
+        return None
+
+    def to_top(self):
+        """Scroll well past the top of the list and reset the position to 0."""
+        baseline = region_signature(self.region)
+        pyautogui.moveTo(*self.center)
+        time.sleep(0.3)
+        pyautogui.scroll(-self.default_clicks_per_box * 30)
+        wait_until_stable(self.region, ceiling=1.5, baseline=baseline)
+        self.position = 0
+
+    def _plausible(self, moved, requested):
+        """True if a measured scroll fits the request.
+
+        It must go the requested way and no more than half a box past the
+        requested distance. Falling short is fine: the list may have ended.
+        """
+        if abs(moved) <= config.SCROLL_TOLERANCE:
+            return True
+        if (moved > 0) != (requested > 0):
+            return False
+        return abs(moved) <= abs(requested) + self.stride // 2
+
+    def scroll_by(self, pixels, learn=True, assume=True):
+        """Scroll by about `pixels` (positive = down) and measure the real movement.
+
+        Returns the measured displacement in pixels. If it can't be
+        measured, the requested amount is assumed — or, with
+        assume=False, None is returned and the position left unchanged.
+        """
+        clicks = int(round(pixels * self.clicks_per_px()))
+        if clicks == 0:
+            return 0
+        before = self._grab()
+        baseline = region_signature(self.region)
+        pyautogui.moveTo(*self.center)
+        time.sleep(0.3)
+        pyautogui.scroll(clicks)
+        wait_until_stable(self.region, ceiling=2.0, baseline=baseline)
+        after = self._grab()
+
+        moved, score = measure_displacement(before, after)
+        if moved is not None and not self._plausible(moved, pixels):
+            print(f"       WARNING: Measured {moved}px for a {pixels}px {self.name} scroll — "
+                  f"discarding it")
+            moved = None
+        if moved is None:
+            if not assume:
+                return None
+            print(f"       WARNING: Couldn't measure {self.name} scroll (score {score:.2f}), "
+                  f"assuming {pixels}px")
+            self.position += pixels
+            return pixels
+        if learn:
+            self._learn(clicks, moved, pixels)
+        self.position += moved
+        self._remember(cv2.cvtColor(after, cv2.COLOR_RGB2GRAY))
+        return moved
+
+    def scroll_to(self, target):
+        """Scroll until the list is at `target` pixels from the top.
+
+        Each step aims at the remaining distance, so any error in one
+        scroll is corrected by the next. Stops early when the list stops
+        moving (its end). Returns the position reached.
+        """
+        for _ in range(config.SCROLL_MAX_STEPS):
+            remaining = target - self.position
+            if abs(remaining) <= config.SCROLL_TOLERANCE:
+                break
+            step = max(-self.page_step, min(self.page_step, remaining))
+            if abs(self.scroll_by(step)) <= config.SCROLL_TOLERANCE:
+                break
+        return self.position
+
+    def jump_to(self, target):
+        """Move to `target` pixels from the top with a single scroll gesture.
+
+        The landing is verified by finding a remembered box where it should
+        be, and a small measured scroll corrects any remaining error. Short
+        moves, and targets with no remembered box to check against, use
+        scroll_to instead; so does a jump that can't be verified, after
+        going back to the top. Returns the position reached.
+        """
+        distance = target - self.position
+        if abs(distance) <= self.page_step or not self._expected_landmarks(target):
+            return self.scroll_to(target)
+
+        start = self.position
+        clicks = int(round(distance * self.clicks_per_px()))
+        baseline = region_signature(self.region)
+        pyautogui.moveTo(*self.center)
+        time.sleep(0.3)
+        pyautogui.scroll(clicks)
+        wait_until_stable(self.region, ceiling=2.0, baseline=baseline)
+        gray = cv2.cvtColor(self._grab(), cv2.COLOR_RGB2GRAY)
+
+        position = self.locate(gray, target)
+        if position is None:
+            print(f"       WARNING: Couldn't verify {self.name} list jump — "
+                  f"scrolling from the top instead")
+            self.to_top()
+            return self.scroll_to(target)
+        self._learn(clicks, position - start, distance)
+        self.position = position
+        self._remember(gray)
+        print(f"       Jumped {self.name} list to {position}px (target {target}px)")
+        return self.scroll_to(target)
+
+    def stitch_to_end(self):
+        """Scroll from the current position to the end of the list, stitching grabs.
+
+        Grabs are placed at their measured positions. Returns (strip,
+        offset): the stitched RGB strip and the list position of its
+        first row. Raises ScrollLost if a scroll can't be measured or the
+        end isn't reached within SCROLL_MAX_PAGES scrolls.
+        """
+        grabs = [(self.position, self._grab())]
+        for _ in range(config.SCROLL_MAX_PAGES):
+            moved = self.scroll_by(self.page_step, assume=False)
+            if moved is None:
+                raise ScrollLost(f"Couldn't measure a {self.name} list scroll "
+                                 f"at {self.position}px")
+            if moved <= config.SCROLL_TOLERANCE:
+                break
+            grabs.append((self.position, self._grab()))
+        else:
+            raise ScrollLost(f"No end to the {self.name} list after "
+                             f"{config.SCROLL_MAX_PAGES} pages")
+
+        offset = grabs[0][0]
+        height = grabs[-1][0] - offset + grabs[-1][1].shape[0]
+        strip = np.empty((height,) + grabs[0][1].shape[1:], dtype=np.uint8)
+        for position, grab in grabs:
+            strip[position - offset:position - offset + grab.shape[0]] = grab
+        return strip, offset
+
+    def remember_strip(self, strip, offset=0):
+        """Remember the boxes of a stitched strip (e.g. loaded from disk) for verifying jumps."""
+        self._remember(cv2.cvtColor(strip, cv2.COLOR_RGB2GRAY), offset)
+
+
+service_list = ScrollTracker("service", config.SERVICE_LIST_REGION,
+                             config.SERVICE_BOX_STRIDE, config.SCROLL_PER_BOX)
+train_list = ScrollTracker("train", config.TRAIN_BOX_REGION,
+                           config.TRAIN_BOX_STRIDE, config.TRAIN_SCROLL_PER_BOX)
+
+
+def calibrate(tracker, steps=5):
+    """Measure clicks per pixel for one list from `steps` page scrolls.
+
+    Starts from the top of the list and replaces the stored calibration
+    with the ratio over every full-length scroll. Returns the new ratio,
+    or None if no scroll could be measured.
+    """
+    print(f"       Calibrating {tracker.name} list...")
+    tracker.to_top()
+    total_clicks = 0
+    total_px = 0
+    for step in range(steps):
+        clicks = int(round(tracker.page_step * tracker.clicks_per_px()))
+        moved = tracker.scroll_by(tracker.page_step, learn=False)
+        print(f"       Scroll {step + 1}: {clicks} clicks -> {moved}px")
+        if abs(moved - tracker.page_step) > tracker.page_step * 0.25:
+            break   # reached the end of the list
+        total_clicks += clicks
+        total_px += moved
+    tracker.to_top()
+
+    if total_px == 0:
+        print(f"       WARNING: No full scrolls measured for the {tracker.name} list")
+        return None
+    ratio = total_clicks / total_px
+    _load()[tracker.name] = {"clicks_per_px": ratio, "samples": 0}
+    _save()
+    print(f"       {tracker.name}: {ratio:.3f} clicks/px "
+          f"({ratio * tracker.stride:.0f} clicks per box)")
+    return ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate list scrolling.")
+    parser.add_argument("lists", nargs="*", default=["service", "train"],
+                        help="lists to calibrate (default: both)")
+    parser.add_argument("--steps", type=int, default=5,
+                        help="page scrolls measured per list")
+    args = parser.parse_args()
+
+    trackers = {"service": service_list, "train": train_list}
+    print("=== Scroll calibration ===\n")
+    print("Make sure TSW is showing a service list, then don't touch the mouse.")
+    time.sleep(3)
+    for name in args.lists:
+        calibrate(trackers[name], steps=args.steps)
+    capture.stop()
+
+
+if __name__ == "__main__":
+    main()
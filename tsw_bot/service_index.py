@@ -0,0 +1,125 @@
+"""One-pass index of a train's service list.
+
+When a train's service list is first opened, it is scrolled through once
+with measured scrolls, the grabs are stitched at their measured offsets,
+and every service box is segmented from the stitched strip by its
+SERVICE_BOX_BORDER_RGB left border. The service loop then works from the
+index: the service count is known up front, every 1_service.png is saved
+in one go, and each service is reached by jumping to its offset.
+
+An index is kept for the rest of the run, and reused only while the
+boxes on screen still match the fingerprints it recorded.
+"""
+import collections
+import os
+import time
+
+import cv2
+from PIL import Image
+
+import borders
+import capture
+import config
+import frame_compare
+import scroll_calibration
+
+# number: 1-based position in the list; top: offset of the box's top edge
+# in pixels from the top of the list (scroll position 0); crop: RGB image
+ServiceEntry = collections.namedtuple("ServiceEntry", "number top height crop fingerprint")
+
+# Indexes already built this run, by list key
+_indexes = {}
+
+
+def fingerprint(crop):
+    """Return a small grayscale thumbnail of a list box, for comparisons.
+
+    Used for the boxes of both the service and the train list.
+    """
+    gray = cv2.cvtColor(crop, cv2.COLOR_RGB2GRAY)
+    return cv2.resize(gray, config.SERVICE_FINGERPRINT_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def same_service(a, b):
+    """True if two service crops show the same service.
+
+    Compared at full resolution by the share of clearly different pixels:
+    services with similar text differ in only a few characters, which a
+    mean difference (or a thumbnail) averages away. For the same reason
+    only a clear difference ends the comparison early (see frame_compare.py).
+    """
+    return frame_compare.compare(a, b, config.SERVICE_SAME_MAX_CHANGED, metric="changed",
+                                 pixel_tol=32, early_same=False).same
+
+
+def _segment_boxes(strip):
+    """Return (top, bottom) row ranges of the service boxes in a stitched strip."""
+    return borders.segment(strip, config.SERVICE_BOX_BORDER_RGB,
+                           config.SERVICE_BOX_COLOR_TOLERANCE, columns=slice(0, 5),
+                           min_length=config.SERVICE_BOX_HEIGHT * 2 // 3)
+
+
+def _matches_screen(entries, position):
+    """True if every whole service box on screen matches the fingerprint
+    of the entry indexed at its offset, with the list at `position`."""
+    img = capture.get_region(config.SERVICE_LIST_REGION, since=time.time())
+    checked = 0
+    for top, bottom in _segment_boxes(img):
+        if top == 0 or bottom == img.shape[0]:
+            continue   # cut off by the edge of the list
+        offset = position + top
+        entry = next((e for e in entries
+                      if abs(e.top - offset) <= config.SCROLL_TOLERANCE), None)
+        if entry is None or not frame_compare.compare(
+                fingerprint(img[top:bottom]), entry.fingerprint,
+                config.SERVICE_FINGERPRINT_MAX_DIFF).same:
+            return False
+        checked += 1
+    return checked > 0
+
+
+def build():
+    """Index the service list currently on screen (scrolled to its top).
+
+    Leaves the list scrolled to its end. Adjacent boxes that look
+    identical are treated as a stitching error and kept once. Returns a
+    list of ServiceEntry, cached under the list's key (see
+    ScrollTracker.reset) for the rest of the run; a cached index is
+    rebuilt if the list on screen no longer matches it.
+    """
+    tracker = scroll_calibration.service_list
+    list_key = tracker.key
+    if list_key in _indexes:
+        if _matches_screen(_indexes[list_key], tracker.position):
+            return _indexes[list_key]
+        print("       Service list doesn't match its index — re-indexing")
+
+    print("       Indexing service list...")
+    strip, offset = tracker.stitch_to_end()
+
+    entries = []
+    for top, bottom in _segment_boxes(strip):
+        crop = strip[top:bottom].copy()
+        if entries and same_service(entries[-1].crop, crop):
+            print(f"       Skipping repeated box at {offset + top}px")
+            continue
+        entries.append(ServiceEntry(len(entries) + 1, offset + top, bottom - top, crop,
+                                    fingerprint(crop)))
+
+    print(f"       Indexed {len(entries)} services ({strip.shape[0]}px of list)")
+    _indexes[list_key] = entries
+    return entries
+
+
+def save_crops(entries, base_dir):
+    """Save each entry's crop as service_NNN/1_service.png under base_dir.
+
+    Returns the service folders, in entry order.
+    """
+    folders = []
+    for entry in entries:
+        service_dir = os.path.join(base_dir, f"service_{entry.number:03d}")
+        os.makedirs(service_dir, exist_ok=True)
+        Image.fromarray(entry.crop).save(os.path.join(service_dir, "1_service.png"))
+        folders.append(service_dir)
+    return folders
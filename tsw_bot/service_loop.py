@@ -1,40 +1,42 @@
 import os
 import time
 
-import numpy as np
 import pyautogui
 from PIL import Image
 
+import borders
+import capture
 import config
-from utils import wait_and_click, wait_for_image
+import health
+import jobs
+import journal
+import matching
+import scroll_calibration
+import service_index
+import train_index
+import wait_scheduler
+import watchdog
+from utils import (
+    ChangeGate,
+    click_and_confirm,
+    region_signature,
+    wait_for_image,
+    wait_until_stable,
+)
 from schedule_capture import capture_schedule
 from navigator import (
-    pass_warning_screen,
-    pass_splash_screen,
-    click_to_the_trains,
-    click_choose_a_route,
-    wait_for_route_screen,
-    select_route,
-    click_timetable,
-    select_train_class,
-    click_train,
-    exit_game,
-    relaunch_and_navigate,
+    IN_LEVEL,
+    MAIN_MENU,
+    NOT_RUNNING,
+    PAUSE_MENU,
+    SERVICE_LIST,
+    TRAIN_LIST,
+    exit_to_main_menu,          # used by the test scripts
+    get_visible_service_boxes,  # used by the test scripts
+    nav,
 )
 
 
-def get_visible_service_boxes():
-    """Calculate the positions of visible service boxes in the scroll area."""
-    boxes = []
-    y = config.SERVICE_LIST_TOP
-    while y + config.SERVICE_BOX_HEIGHT <= config.SERVICE_LIST_BOTTOM:
-        center_x = (config.SERVICE_LIST_LEFT + config.SERVICE_LIST_RIGHT) // 2
-        center_y = y + config.SERVICE_BOX_HEIGHT // 2
-        boxes.append((center_x, center_y))
-        y += config.SERVICE_BOX_STRIDE
-    return boxes
-
-
 def screenshot_service_box(output_dir, y_center):
     """Take a screenshot of a service box, using border color to find exact edges.
 
@@ -49,29 +51,12 @@ def screenshot_service_box(output_dir, y_center):
     grab_width = config.SERVICE_LIST_RIGHT - config.SERVICE_LIST_LEFT + 10
     grab_height = config.SERVICE_BOX_HEIGHT + 2 * padding
 
-    screenshot = pyautogui.screenshot(region=(grab_left, grab_top, grab_width, grab_height))
-    img = np.array(screenshot)  # RGB
-
-    # Scan a strip along the left edge for the border color
-    target = np.array(config.SERVICE_BOX_BORDER_RGB)
-    tol = config.SERVICE_BOX_COLOR_TOLERANCE
-    strip = img[:, :5, :].astype(int)
-    match = np.all(np.abs(strip - target) <= tol, axis=2)
-    row_match = np.any(match, axis=1)
-
-    # Find contiguous runs of matching rows
-    runs = []
-    in_run = False
-    run_start = 0
-    for r in range(len(row_match)):
-        if row_match[r] and not in_run:
-            run_start = r
-            in_run = True
-        elif not row_match[r] and in_run:
-            runs.append((run_start, r))
-            in_run = False
-    if in_run:
-        runs.append((run_start, len(row_match)))
+    img = capture.get_region((grab_left, grab_top, grab_width, grab_height),
+                             since=time.time())  # RGB
+
+    # Runs of rows with the border color along the left edge
+    runs = borders.segment(img, config.SERVICE_BOX_BORDER_RGB,
+                           config.SERVICE_BOX_COLOR_TOLERANCE, columns=slice(0, 5))
 
     if runs:
         # Pick the run whose center is closest to the expected center
@@ -90,52 +75,48 @@ def click_service_box(x, y):
     """Click on a service box, then press Enter twice to load the level."""
     pyautogui.moveTo(x, y)
     time.sleep(0.5)
+    baseline = region_signature(config.SERVICE_LIST_REGION)
     pyautogui.mouseDown()
     time.sleep(0.2)
     pyautogui.mouseUp()
-    time.sleep(1.5)           # give game time to highlight/select the box
+    # Give game time to highlight/select the box
+    wait_until_stable(config.SERVICE_LIST_REGION, ceiling=1.5, baseline=baseline)
     pyautogui.press("enter")
     time.sleep(1.0)
     pyautogui.press("enter")
 
 
-def _check_for_level_screen():
+def _level_screen_candidates():
+    """Reference variants for the screens that can follow a service load."""
+    return {
+        "driver": [r for r in (config.REF_DRIVER, config.REF_DRIVER_1) if os.path.isfile(r)],
+        "get_started": [r for r in (config.REF_GET_STARTED, config.REF_GET_STARTED_2)
+                        if os.path.isfile(r)],
+    }
+
+
+def _check_for_level_screen(frame=None):
     """Check once for driver selection or get_started screen.
 
     Returns 'driver' if driver screen found (and clicks it),
     'get_started' if get_started screen found, or None if neither.
+    All variants are classified against the same captured frame.
     """
-    # Try each driver reference image
-    for driver_ref in (config.REF_DRIVER, config.REF_DRIVER_1):
-        if not os.path.isfile(driver_ref):
-            continue
-        try:
-            driver_loc = pyautogui.locateOnScreen(driver_ref, confidence=config.CONFIDENCE)
-            if driver_loc is not None:
-                print(f"       Driver selection detected via '{os.path.basename(driver_ref)}' — clicking...")
-                center = pyautogui.center(driver_loc)
-                pyautogui.moveTo(center)
-                time.sleep(0.5)
-                pyautogui.mouseDown()
-                time.sleep(0.2)
-                pyautogui.mouseUp()
-                time.sleep(config.CLICK_SETTLE_DELAY)
-                return "driver"
-        except pyautogui.ImageNotFoundException:
-            pass
-
-    # Try each get_started reference image
-    for started_ref in (config.REF_GET_STARTED, config.REF_GET_STARTED_2):
-        if not os.path.isfile(started_ref):
-            continue
-        try:
-            started_loc = pyautogui.locateOnScreen(started_ref, confidence=config.CONFIDENCE)
-            if started_loc is not None:
-                return "get_started"
-        except pyautogui.ImageNotFoundException:
-            pass
-
-    return None
+    hit = matching.classify(_level_screen_candidates(), frame, confidence=config.CONFIDENCE,
+                            mode=config.MATCH_MODE)
+    if hit is None:
+        return None
+
+    if hit.state == "driver":
+        print(f"       Driver selection detected via '{os.path.basename(hit.ref)}' — clicking...")
+        center = pyautogui.center(hit.box)
+        pyautogui.moveTo(center)
+        time.sleep(0.5)
+        pyautogui.mouseDown()
+        time.sleep(0.2)
+        pyautogui.mouseUp()
+        wait_until_stable()
+    return hit.state
 
 
 def wait_for_level_load(click_x=None, click_y=None):
@@ -146,15 +127,32 @@ def wait_for_level_load(click_x=None, click_y=None):
     """
     print("       Waiting for level to load...")
 
+    # Poll timing adapts to how long this route's levels usually take to load
+    plan = wait_scheduler.plan("level load", config.RETRY_WAIT, 1.0)
+    load_start = time.time()
+
     for attempt in range(1, config.RETRY_MAX + 1):
-        # Wait RETRY_WAIT seconds for either driver or get_started screen
+        # Wait for either driver or get_started screen, only re-matching
+        # when the screen has changed
+        gate = ChangeGate()
         start = time.time()
         found = None
-        while time.time() - start < config.RETRY_WAIT:
-            found = _check_for_level_screen()
-            if found is not None:
-                break
-            time.sleep(1.0)
+        while time.time() - start < plan.ceiling:
+            watchdog.check()
+            plan.check_overdue(time.time() - load_start)
+            frame, _ = capture.get_frame()
+            if gate.changed(frame):
+                found = _check_for_level_screen(frame)
+                if found is not None:
+                    load_seconds = time.time() - load_start
+                    plan.done(load_seconds)
+                    health.monitor.record_load(load_seconds)
+                    watchdog.progress()
+                    break
+            time.sleep(plan.next_interval(time.time() - load_start))
+        if gate.skipped:
+            print(f"       Level-load check skipped {gate.skipped} unchanged frames "
+                  f"({gate.evaluated} checked)")
 
         if found is not None:
             break
@@ -169,422 +167,224 @@ def wait_for_level_load(click_x=None, click_y=None):
                 print(f"       Screen hasn't changed (attempt {attempt}/{config.RETRY_MAX}), "
                       f"waiting again...")
         else:
+            plan.expired(time.time() - load_start)
             raise TimeoutError("Timed out waiting for level to load after "
                                f"{config.RETRY_MAX} attempts")
 
     # Now wait for either get_started variant and click it
     print("       Waiting for 'Get Started' screen...")
-    get_started_refs = [r for r in (config.REF_GET_STARTED, config.REF_GET_STARTED_2)
-                        if os.path.isfile(r)]
-    found_loc = None
-    start = time.time()
-    while time.time() - start < config.SCREEN_TIMEOUT:
-        for ref in get_started_refs:
-            try:
-                loc = pyautogui.locateOnScreen(ref, confidence=config.CONFIDENCE)
-                if loc is not None:
-                    found_loc = loc
-                    break
-            except pyautogui.ImageNotFoundException:
-                pass
-        if found_loc is not None:
-            break
-        time.sleep(1.0)
+    get_started_refs = _level_screen_candidates()["get_started"]
+    found_loc = wait_for_image(get_started_refs, timeout=config.SCREEN_TIMEOUT,
+                               confidence=config.CONFIDENCE)
     if found_loc is None:
         raise TimeoutError("Timed out waiting for 'Get Started' screen")
 
-    # Click 'Get Started' with retry — re-click if it's still visible
-    for click_attempt in range(1, config.RETRY_MAX + 1):
-        print("       Level loaded — clicking 'Get Started'...")
-        center = pyautogui.center(found_loc)
-        pyautogui.moveTo(center)
-        time.sleep(0.5)
-        pyautogui.mouseDown()
-        time.sleep(0.2)
-        pyautogui.mouseUp()
-        time.sleep(3.0)
-
-        # Check if Get Started is still on screen
-        still_visible = False
-        for ref in get_started_refs:
-            try:
-                loc = pyautogui.locateOnScreen(ref, confidence=config.CONFIDENCE)
-                if loc is not None:
-                    still_visible = True
-                    found_loc = loc
-                    break
-            except pyautogui.ImageNotFoundException:
-                pass
-
-        if not still_visible:
-            break
-
-        if click_attempt < config.RETRY_MAX:
-            print(f"       'Get Started' still visible (attempt {click_attempt}/{config.RETRY_MAX}), "
-                  f"clicking again...")
-        else:
-            print(f"       WARNING: 'Get Started' still visible after {config.RETRY_MAX} attempts")
+    # Click 'Get Started', re-clicking quickly if the game doesn't react
+    print("       Level loaded — clicking 'Get Started'...")
+    if not click_and_confirm(get_started_refs, found_loc, confidence=config.CONFIDENCE):
+        print(f"       WARNING: 'Get Started' still visible after {config.RETRY_MAX} attempts")
 
-    time.sleep(5.0)           # game needs time to transition into gameplay
+    wait_until_stable(ceiling=5.0)   # game needs time to transition into gameplay
 
 
-def exit_to_main_menu():
-    """Press Escape, find 'Exit to Main Menu', and press Enter twice."""
-    print("       Pressing Escape...")
-    pyautogui.press("escape")
-    time.sleep(4.0)           # pause menu needs time to render
+def count_trains(route=None, train_class=None):
+    """Return the number of trains in the current train class.
 
-    print("       Clicking 'Exit to Main Menu'...")
-    if not wait_and_click(config.REF_EXIT_TO_MAIN_MENU, timeout=config.SCREEN_TIMEOUT, confidence=config.CONFIDENCE):
-        raise TimeoutError("Timed out waiting for 'Exit to Main Menu'")
-    time.sleep(1.0)
-    print("       Pressing Enter twice...")
-    pyautogui.press("enter")
-    time.sleep(0.5)
-    pyautogui.press("enter")
-    time.sleep(config.CLICK_SETTLE_DELAY)
-
-
-def _count_visible_trains(img):
-    """Count visible train entries by scanning the left edge for #dedede borders.
-
-    Returns the number of distinct train entries visible in the image.
-    """
-    border_rgb = np.array([0xde, 0xde, 0xde])
-    border_tol = 20
-    min_entry_height = 40
-
-    strip = img[:, :3, :].astype(int)
-    match = np.all(np.abs(strip - border_rgb) <= border_tol, axis=2)
-    row_has_border = np.any(match, axis=1)
-
-    runs = []
-    in_run = False
-    run_start = 0
-    for r in range(len(row_has_border)):
-        if row_has_border[r] and not in_run:
-            run_start = r
-            in_run = True
-        elif not row_has_border[r] and in_run:
-            runs.append((run_start, r))
-            in_run = False
-    if in_run:
-        runs.append((run_start, len(row_has_border)))
-
-    return len([(s, e) for s, e in runs if (e - s) >= min_entry_height])
-
-
-def count_trains():
-    """Count the number of trains in the current train class scroll box.
-
-    Detects visible trains from the first frame, then scrolls one box at
-    a time until the list stops moving. Returns visible + scrolls.
-    Scrolls back to the top when done.
+    Comes from the train-list index (train_index.py), so the list is only
+    scrolled the first time a route/class is seen.
     """
     print("       Counting trains...")
-
-    def _capture():
-        region = (config.TRAIN_BOX_LEFT, config.TRAIN_BOX_TOP,
-                  config.TRAIN_BOX_WIDTH, config.TRAIN_BOX_HEIGHT)
-        return np.array(pyautogui.screenshot(region=region))
-
-    def _frames_match(a, b):
-        if a.shape != b.shape:
-            return False
-        return np.mean(np.abs(a.astype(float) - b.astype(float))) < 5.0
-
-    first_img = _capture()
-    visible_count = _count_visible_trains(first_img)
-    print(f"       Visible trains in first frame: {visible_count}")
-
-    prev_img = first_img
-    scrolls = 0
-    center_x = config.TRAIN_BOX_LEFT + config.TRAIN_BOX_WIDTH // 2
-    center_y = config.TRAIN_BOX_TOP + config.TRAIN_BOX_HEIGHT // 2
-
-    for _ in range(30):
-        pyautogui.moveTo(center_x, center_y)
-        time.sleep(0.3)
-        pyautogui.scroll(config.TRAIN_SCROLL_PER_BOX)
-        time.sleep(1.0)
-
-        curr_img = _capture()
-        if _frames_match(prev_img, curr_img):
-            break
-        scrolls += 1
-        prev_img = curr_img
-
-    total = visible_count + scrolls
-
-    # Scroll back to top
-    if scrolls > 0:
-        pyautogui.moveTo(center_x, center_y)
-        time.sleep(0.3)
-        pyautogui.scroll(-config.TRAIN_SCROLL_PER_BOX * scrolls)
-        time.sleep(1.0)
-
-    print(f"       Found {total} trains ({visible_count} visible + {scrolls} scrolls).")
+    total = len(train_index.get(route, train_class))
+    print(f"       Found {total} trains.")
     return total
 
 
-def _return_to_main_menu_from_menus():
-    """From any in-game menu screen, press Escape until we reach the main menu.
+def relaunch_if_unhealthy():
+    """Exit the game if health.py says it needs a restart.
 
-    Checks for the 'To The Trains' tile to confirm we're at the main menu.
-    Used when we're at the service list or class selection and need to get
-    back to the main menu (not from inside a level — use exit_to_main_menu for that).
+    The next nav.go_to relaunches it and navigates back. Returns True if
+    the game was exited.
     """
-    for attempt in range(6):
-        # Check if we're already at the main menu
-        try:
-            loc = pyautogui.locateOnScreen(config.REF_TO_THE_TRAINS, confidence=config.CONFIDENCE)
-            if loc is not None:
-                print("       At main menu.")
-                return
-        except pyautogui.ImageNotFoundException:
-            pass
+    reason = health.monitor.check()
+    if reason is None:
+        return False
+    print(f"       Relaunching game: {reason} ({health.monitor.summary()})")
+    health.monitor.relaunches += 1
+    nav.go_to(NOT_RUNNING)
+    return True
 
-        print(f"       Pressing Escape (attempt {attempt + 1})...")
-        pyautogui.press("escape")
-        time.sleep(2.0)
 
-    print("       WARNING: Could not confirm main menu after Escape presses")
+def _index_services(train_idx, route, train_class):
+    """Open the train's service list at its top and index it."""
+    nav.go_to(SERVICE_LIST, route=route, train_class=train_class, train=train_idx)
+    entries = service_index.build()
+    nav.mark(SERVICE_LIST, offset=scroll_calibration.service_list.position)
+    return entries
 
 
-def navigate_to_train_list():
-    """Re-navigate from main menu back to the train list (skips warning/splash).
+def process_service(entry, service_dir, train_idx, route=None, train_class=None):
+    """Load one indexed service from the service list and capture its schedule.
 
-    Stops at the train selection screen — does NOT click a specific train.
+    Starts by navigating to the service's offset in the list, so it can be
+    retried from wherever the game was left. Returns at the main menu,
+    with the path of the saved schedule (None if it couldn't be captured).
     """
-    print("       Re-navigating to train list...")
-    click_to_the_trains()
-    click_choose_a_route()
-    wait_for_route_screen()
-    select_route()
-    click_timetable()
-    select_train_class()
-    print("       Back at train list.")
-
-
-def navigate_to_service_list(train_index):
-    """Re-navigate from main menu back to the service list for a specific train."""
-    navigate_to_train_list()
-    click_train(train_index)
-
-
-def scroll_service_list_down():
-    """Scroll the service list down by one full page."""
-    center_x = (config.SERVICE_LIST_LEFT + config.SERVICE_LIST_RIGHT) // 2
-    center_y = (config.SERVICE_LIST_TOP + config.SERVICE_LIST_BOTTOM) // 2
-    pyautogui.moveTo(center_x, center_y)
-    time.sleep(0.3)
-    visible_count = len(get_visible_service_boxes())
-    scroll_clicks = config.SCROLL_PER_BOX * (visible_count - 1)
-    pyautogui.scroll(scroll_clicks)
-    time.sleep(2.0)           # let scroll animation settle
-
-
-def _service_is_duplicate(service_dir, prev_service_img):
-    """Compare current service screenshot against the previous one.
-
-    Returns True if they are nearly identical (duplicate from scroll drift).
-    """
-    if prev_service_img is None:
-        return False
-    curr_path = os.path.join(service_dir, "1_service.png")
-    if not os.path.isfile(curr_path):
-        return False
-    curr_img = np.array(Image.open(curr_path))
-    if curr_img.shape != prev_service_img.shape:
-        return False
-    diff = np.mean(np.abs(curr_img.astype(float) - prev_service_img.astype(float)))
-    print(f"       Diff from previous service: {diff:.1f}")
-    return diff < 5.0
-
-
-def process_all_services(base_dir, train_index, max_services=None):
+    # Bring the box into view (at the top of the list unless the list
+    # ends first) and work out where it landed
+    nav.go_to(SERVICE_LIST, route=route, train_class=train_class,
+              train=train_idx, offset=entry.top)
+    position = scroll_calibration.service_list.position
+    x = (config.SERVICE_LIST_LEFT + config.SERVICE_LIST_RIGHT) // 2
+    y = config.SERVICE_LIST_TOP + entry.top - position + entry.height // 2
+
+    print(f"       Clicking service at ({x}, {y})...")
+    click_service_box(x, y)
+    nav.mark(IN_LEVEL)
+
+    # Wait for level to load and get past "Get Started" screen
+    # Passes click coordinates so it can re-click if the screen doesn't change
+    wait_for_level_load(click_x=x, click_y=y)
+
+    # Capture the schedule; this leaves the pause menu open, so
+    # exiting is just 'Exit to Main Menu'
+    schedule_path = capture_schedule(service_dir)
+    if schedule_path is not None:
+        nav.mark(PAUSE_MENU)
+    else:
+        nav.mark(None)   # let the navigator work out where we are
+    nav.go_to(MAIN_MENU)
+    return schedule_path
+
+
+def process_all_services(base_dir, train_idx, max_services=None, route=None, train_class=None,
+                         job_journal=None):
     """Iterate through services for one train, capture each timetable.
 
-    Always returns with the game at the MAIN MENU (after exit_to_main_menu).
+    Indexes the whole service list first (see service_index.py), saves
+    every service's 1_service.png, then loads each indexed service by
+    jumping straight to its offset in the list. A service that gets stuck
+    is recovered and retried (see watchdog.py) rather than ending the run.
+
+    Returns at the main menu after the last service (or at the service
+    list if there were none); either way the navigator knows where.
 
     Args:
         base_dir: Directory for this train's service folders (e.g. screenshots/train_01/).
-        train_index: 0-based index of the current train (for re-navigation).
+        train_idx: 0-based index of the current train (for re-navigation).
         max_services: Maximum services to capture (None = unlimited).
+        route, train_class: Selections to navigate back to (default: config).
+        job_journal: journal.Journal to checkpoint each captured service in;
+            services already recorded there are skipped. The train is only
+            recorded as done once every service has been captured.
     """
-    service_index = 0
-    page = 0
-    previous_screenshot = None
-    prev_service_img = None
-
-    while True:
-        boxes = get_visible_service_boxes()
-        start_box = 0 if page == 0 else 1  # skip first box on subsequent pages (overlap)
-
-        for i in range(start_box, len(boxes)):
-            x, y = boxes[i]
-            service_index += 1
-            print(f"\n--- Service #{service_index} ---")
-
-            # Create per-service folder
-            service_dir = os.path.join(base_dir, f"service_{service_index:03d}")
-            os.makedirs(service_dir, exist_ok=True)
-
-            # Click the service box to select/highlight it
-            print(f"       Clicking service at ({x}, {y})...")
-            pyautogui.moveTo(x, y)
-            time.sleep(0.5)
-            pyautogui.mouseDown()
-            time.sleep(0.2)
-            pyautogui.mouseUp()
-            time.sleep(1.5)       # give game time to highlight the selection
-
-            # Screenshot the selected service box
-            img_path = screenshot_service_box(service_dir, y)
-            print(f"       Saved service name: {img_path}")
-
-            # Check for duplicate (scroll drift)
-            if _service_is_duplicate(service_dir, prev_service_img):
-                print(f"       DUPLICATE detected — skipping service #{service_index}")
-                # Clean up the duplicate folder
-                os.remove(img_path)
-                os.rmdir(service_dir)
-                service_index -= 1
-                continue
-
-            # Update previous service image for next comparison
-            prev_service_img = np.array(Image.open(img_path))
-
-            # Press Enter twice to load the level
-            pyautogui.press("enter")
-            time.sleep(1.0)
-            pyautogui.press("enter")
-
-            # Wait for level to load and get past "Get Started" screen
-            # Passes click coordinates so it can re-click if the screen doesn't change
-            wait_for_level_load(click_x=x, click_y=y)
-
-            # Capture the schedule
-            capture_schedule(service_dir)
-
-            # Exit back to main menu (we're now at main menu)
-            exit_to_main_menu()
-
-            # Check service limit AFTER exiting to main menu, BEFORE re-navigating
-            if max_services is not None and service_index >= max_services:
-                print(f"\n       Reached service limit ({max_services}), stopping.")
-                print(f"\nProcessed {service_index} services for this train.")
-                return service_index  # at main menu
-
-            # Re-navigate to the service list
-            navigate_to_service_list(train_index)
-
-            # Scroll back to the right position
-            print(f"       Scrolling back to page {page}...")
-            for _ in range(page):
-                scroll_service_list_down()
-            time.sleep(1.0)
-
-        # Scroll down for the next page
-        print(f"\n--- Scrolling to next page (page {page + 1}) ---")
-        scroll_service_list_down()
-
-        # Take a screenshot to check if we've reached the end
-        # (compare with previous page - if identical, we're done)
-        check_region = (
-            config.SERVICE_LIST_LEFT,
-            config.SERVICE_LIST_TOP,
-            config.SERVICE_LIST_RIGHT - config.SERVICE_LIST_LEFT,
-            config.SERVICE_LIST_BOTTOM - config.SERVICE_LIST_TOP,
-        )
-        current_page_screenshot = pyautogui.screenshot(region=check_region)
-
-        if previous_screenshot is not None:
-            current_arr = np.array(current_page_screenshot)
-            prev_arr = np.array(previous_screenshot)
-            if current_arr.shape == prev_arr.shape:
-                diff = np.mean(np.abs(current_arr.astype(float) - prev_arr.astype(float)))
-                print(f"       Page difference: {diff:.1f}")
-                if diff < 5.0:  # nearly identical = end of list
-                    print("\n=== Reached end of service list ===")
-                    break
-
-        previous_screenshot = current_page_screenshot
-        page += 1
-
-    # Natural end of service list — we're at the service list (a menu).
-    # Need to get back to main menu for the train loop.
-    print(f"\n       Reached end of service list. Returning to main menu...")
-    _return_to_main_menu_from_menus()
-    print(f"\nProcessed {service_index} services for this train.")
-    return service_index
-
-
-def process_all_trains():
-    """Outer loop: iterate through all trains in the class, processing services for each."""
-    from datetime import datetime, timedelta
-
-    run_start = time.time()
-
-    # Create route/class folder structure
-    route_dir = os.path.join(config.SCREENSHOTS_DIR, config.ROUTE_NAME)
-    class_dir = os.path.join(route_dir, config.TRAIN_CLASS)
-    os.makedirs(class_dir, exist_ok=True)
-
-    train_count = count_trains()
-    print(f"\n=== Processing {train_count} trains for '{config.TRAIN_CLASS}' ===\n")
-
-    train_results = []  # list of (train_number, service_count, duration_seconds)
-
-    for train_idx in range(train_count):
-        train_start = time.time()
+    train_number = train_idx + 1
+    done = job_journal.completed_services(train_number) if job_journal else set()
+    index_start = time.time()
+    entries = watchdog.run_with_recovery(
+        f"indexing train {train_number}",
+        lambda: _index_services(train_idx, route, train_class))
+    if job_journal:
+        job_journal.record("indexed", train=train_number, services=len(entries),
+                           seconds=round(time.time() - index_start, 1))
+    if max_services is not None:
+        entries = entries[:max_services]
+    folders = service_index.save_crops(entries, base_dir)
+    print(f"       Saved {len(folders)} service names")
+
+    pending = [(entry, folder) for entry, folder in zip(entries, folders)
+               if entry.number not in done]
+    if len(pending) < len(entries):
+        print(f"       Resuming: {len(entries) - len(pending)} services already captured")
+
+    failed = []
+    for count, (entry, service_dir) in enumerate(pending, 1):
+        print(f"\n--- Service #{entry.number} ({count}/{len(pending)}) ---")
+        service_start = time.time()
+        schedule_path = watchdog.run_with_recovery(
+            f"service #{entry.number}",
+            lambda: process_service(entry, service_dir, train_idx, route, train_class))
+        if schedule_path is None:
+            # Left out of the journal, so --resume tries it again
+            print(f"       Service #{entry.number}: schedule not captured")
+            failed.append(entry.number)
+        elif job_journal:
+            job_journal.record("service", train=train_number, service=entry.number,
+                               offset=entry.top, time=round(service_start, 1),
+                               seconds=round(time.time() - service_start, 1),
+                               dir=service_dir, schedule=schedule_path)
+        relaunch_if_unhealthy()
+
+    if failed:
+        print(f"\n       {len(failed)} services not captured: "
+              f"{', '.join(f'#{number}' for number in failed)}")
+    elif job_journal:
+        job_journal.record("train", train=train_number, services=len(entries))
+
+    if max_services is not None and len(entries) >= max_services:
+        print(f"\n       Reached service limit ({max_services}), stopping.")
+    print(f"\nProcessed {len(entries)} services for this train.")
+    return len(entries)
+
+
+def process_all_trains(job=None, resume=False):
+    """Outer loop: iterate through the job's trains, processing services for each.
+
+    `job` is a jobs.Job (default: the route/class in config.py). Progress
+    is checkpointed in the job's journal (see journal.py); with
+    resume=True, services already in it are skipped. Returns the path of
+    the report written from the journal.
+    """
+    if job is None:
+        job = jobs.default_job()
+    wait_scheduler.set_route(job.route)
+    job_journal = journal.Journal(job.output_dir, resume=resume)
+    job_journal.record("run", time=round(time.time(), 1), route=job.route,
+                       train_class=job.train_class, resume=resume)
+
+    # Switching class on the same route doesn't back out of the timetable screen
+    def open_train_list():
+        nav.go_to(TRAIN_LIST, route=job.route, train_class=job.train_class)
+        return count_trains(job.route, job.train_class)
+
+    train_count = watchdog.run_with_recovery(f"opening '{job.train_class}'", open_train_list)
+    train_numbers = list(range(1, train_count + 1))
+    if job.trains is not None:
+        missing = [n for n in job.trains if n > train_count]
+        if missing:
+            print(f"       WARNING: '{job.train_class}' has {train_count} trains — "
+                  f"skipping train(s) {missing}")
+        train_numbers = [n for n in job.trains if n <= train_count]
+    finished = job_journal.completed_trains()
+    if finished & set(train_numbers):
+        print(f"       Resuming: train(s) {sorted(finished & set(train_numbers))} already done")
+    print(f"\n=== Processing {len(train_numbers)} of {train_count} trains "
+          f"for '{job.train_class}' ===\n")
+
+    for position, train_number in enumerate(train_numbers, 1):
+        if train_number in finished:
+            continue
+        train_idx = train_number - 1
         print(f"\n{'='*50}")
-        print(f"=== Train {train_idx + 1}/{train_count} ===")
+        print(f"=== Train {train_number}/{train_count} ({position} of {len(train_numbers)}) ===")
         print(f"{'='*50}")
 
-        # Create per-train folder inside class folder
-        train_dir = os.path.join(class_dir, f"train_{train_idx + 1:02d}")
+        # Create per-train folder inside the job's folder
+        train_dir = os.path.join(job.output_dir, f"train_{train_number:02d}")
         os.makedirs(train_dir, exist_ok=True)
 
-        # Click the train
-        click_train(train_idx)
-
-        # Process services for this train
-        svc_count = process_all_services(
+        # Process services for this train (navigates to its service list,
+        # relaunching first if needed)
+        process_all_services(
             base_dir=train_dir,
-            train_index=train_idx,
-            max_services=config.MAX_SERVICES_PER_TRAIN,
+            train_idx=train_idx,
+            max_services=job.max_services,
+            route=job.route,
+            train_class=job.train_class,
+            job_journal=job_journal,
         )
 
-        train_duration = time.time() - train_start
-        train_results.append((train_idx + 1, svc_count, train_duration))
-
-        # Exit and relaunch game between trains to avoid memory issues.
-        # process_all_services returns at main menu.
-        if train_idx < train_count - 1:
-            exit_game()
-            relaunch_and_navigate()
-
-    total_duration = time.time() - run_start
-    total_services = sum(r[1] for r in train_results)
-
-    print(f"\n=== All {train_count} trains processed! ===")
-
-    # Write summary report
-    report_path = os.path.join(class_dir, "report.txt")
-    started = datetime.fromtimestamp(run_start)
-    with open(report_path, "w") as f:
-        f.write(f"TSW Timetable Bot — Run Report\n")
-        f.write(f"{'='*40}\n\n")
-        f.write(f"Route:       {config.ROUTE_NAME}\n")
-        f.write(f"Train Class: {config.TRAIN_CLASS}\n")
-        f.write(f"Started:     {started:%Y-%m-%d %H:%M:%S}\n")
-        f.write(f"Duration:    {timedelta(seconds=int(total_duration))}\n")
-        f.write(f"Trains:      {train_count}\n")
-        f.write(f"Services:    {total_services}\n\n")
-        f.write(f"{'Train':<10} {'Services':<10} {'Duration'}\n")
-        f.write(f"{'-'*10} {'-'*10} {'-'*10}\n")
-        for train_num, svc_count, dur in train_results:
-            f.write(f"Train {train_num:<4} {svc_count:<10} {timedelta(seconds=int(dur))}\n")
+    print(f"\n=== All {len(train_numbers)} trains processed! ===")
 
+    report_path = job_journal.write_report()
     print(f"\nReport saved to: {report_path}")
+    return report_path
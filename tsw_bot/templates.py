@@ -0,0 +1,69 @@
+"""Reference-template registry.
+
+Every reference image is decoded once (built at startup by
+main.check_references), converted to the matcher's colour space and
+downscaled for the coarse matching passes. Matchers look templates up by
+their config.REF_* path instead of reading the PNG on every poll.
+"""
+import os
+
+import cv2
+
+import config
+
+
+class Template:
+    """A decoded reference image, ready for matching.
+
+    rgb:    full-resolution RGB (same colour order as captured frames)
+    gray:   full-resolution grayscale
+    scaled: {scale: grayscale image} for each of config.TEMPLATE_SCALES
+    """
+
+    def __init__(self, path, rgb):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.rgb = rgb
+        self.gray = cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        self.height, self.width = rgb.shape[:2]
+        self.scaled = {}
+        for scale in config.TEMPLATE_SCALES:
+            w = max(1, round(self.width * scale))
+            h = max(1, round(self.height * scale))
+            self.scaled[scale] = cv2.resize(self.gray, (w, h), interpolation=cv2.INTER_AREA)
+
+
+_registry = {}
+
+
+def all_refs():
+    """Return every config.REF_* reference path."""
+    return [getattr(config, name) for name in sorted(dir(config)) if name.startswith("REF_")]
+
+
+def load(path):
+    """Decode a reference image into the registry. Returns the Template or None."""
+    bgr = cv2.imread(path, cv2.IMREAD_COLOR)
+    if bgr is None:
+        return None
+    template = Template(path, cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+    _registry[path] = template
+    return template
+
+
+def load_all(paths=None):
+    """Load every reference that exists on disk. Returns the paths that couldn't be loaded."""
+    if paths is None:
+        paths = all_refs()
+    return [path for path in paths if load(path) is None]
+
+
+def get(path):
+    """Return the Template for a reference path, loading it on first use.
+
+    Returns None if the image can't be read.
+    """
+    template = _registry.get(path)
+    if template is None:
+        template = load(path)
+    return template
@@ -0,0 +1,93 @@
+"""Test script: schedule frame overlap detection on synthetic frames.
+
+Needs no game: builds two overlapping frames of one tall page and checks
+where schedule_capture.find_overlap joins them. Pages are either random
+texture or schedule-like: flat box-coloured rows with lines of text,
+between dark separators.
+
+Run with pytest, or directly: python test_overlap.py
+"""
+import numpy as np
+
+import config
+from schedule_capture import BOX_COLORS, SEPARATOR_RGB, find_overlap
+
+HEIGHT = 300
+WIDTH = 400
+SCROLLS = range(120, 241, 7)   # rows the second frame is scrolled down by
+
+
+def texture_page(height, seed=0):
+    """Return a page of random texture."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, size=(height, WIDTH, 3), dtype=np.uint8)
+
+
+def schedule_page(height, seed=0):
+    """Return a schedule-like page: alternating boxes of flat colour, each
+    with a line or two of dark "text", separated by dark lines."""
+    rng = np.random.default_rng(seed)
+    page = np.empty((height, WIDTH, 3), dtype=np.uint8)
+    top, box = 0, 0
+    while top < height:
+        box_height = int(rng.integers(50, 90))
+        page[top:top + box_height] = BOX_COLORS[box % 2]
+        for line_top in range(top + 8, top + box_height - 14, 24):
+            # Glyphs: short dark runs of varying width along the line
+            x = int(rng.integers(10, 40))
+            while x < WIDTH - 20:
+                glyph = int(rng.integers(3, 9))
+                page[line_top:line_top + 12, x:x + glyph] = (20, 20, 20)
+                x += glyph + int(rng.integers(2, 12))
+        page[top + box_height:top + box_height + 3] = SEPARATOR_RGB
+        top += box_height + 3
+        box += 1
+    return page
+
+
+def make_frames(page, scroll):
+    """Return (prev, curr): two frames of `page`, `scroll` rows apart."""
+    return page[:HEIGHT].copy(), page[scroll:scroll + HEIGHT].copy()
+
+
+def test_exact_overlap():
+    page = texture_page(HEIGHT + max(SCROLLS))
+    for scroll in SCROLLS:
+        overlap, diff = find_overlap(*make_frames(page, scroll))
+        assert overlap == HEIGHT - scroll
+        assert diff == 0.0
+
+
+def test_schedule_overlap():
+    for seed in range(4):
+        page = schedule_page(HEIGHT + max(SCROLLS), seed)
+        for scroll in SCROLLS:
+            overlap, _ = find_overlap(*make_frames(page, scroll))
+            assert overlap == HEIGHT - scroll, (seed, scroll, overlap)
+
+
+def test_localized_difference_inside_overlap():
+    # A clock that ticked between the grabs: a small patch inside the
+    # matched band differs
+    for page in (texture_page(HEIGHT + max(SCROLLS)),
+                 schedule_page(HEIGHT + max(SCROLLS))):
+        for scroll in SCROLLS:
+            prev, curr = make_frames(page, scroll)
+            curr[10:16, 50:70] = 255 - curr[10:16, 50:70]
+            overlap, _ = find_overlap(prev, curr)
+            assert overlap == HEIGHT - scroll
+
+
+def test_no_overlap():
+    prev, _ = make_frames(texture_page(HEIGHT, seed=0), 0)
+    curr, _ = make_frames(texture_page(HEIGHT, seed=1), 0)
+    overlap, diff = find_overlap(prev, curr)
+    assert overlap == 0
+    assert diff > config.SCHEDULE_OVERLAP_MAX_DIFF
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_") and callable(test):
+            test()
+            print(f"{name}: ok")
@@ -15,6 +15,7 @@ from PIL import Image
 pyautogui.FAILSAFE = False
 
 import config
+import frame_compare
 
 
 def capture_schedule_region():
@@ -128,10 +129,7 @@ def scroll_schedule_down(amount=-2000):
 
 def frames_match(a, b, threshold=5.0):
     """Check if two frames are nearly identical (scroll didn't move)."""
-    if a.shape != b.shape:
-        return False
-    diff = np.mean(np.abs(a.astype(float) - b.astype(float)))
-    return diff < threshold
+    return frame_compare.compare(a, b, threshold).same
 
 
 def main():
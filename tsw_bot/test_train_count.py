@@ -16,7 +16,9 @@ from PIL import Image
 
 pyautogui.FAILSAFE = False
 
+import borders
 import config
+import frame_compare
 
 # Train scroll box coordinates
 TRAIN_BOX_LEFT = 3218
@@ -45,22 +47,8 @@ def count_visible_trains(img):
 
     Returns (count, runs) where runs is a list of (start_row, end_row) tuples.
     """
-    strip = img[:, :3, :].astype(int)
-    match = np.all(np.abs(strip - BORDER_RGB) <= BORDER_TOL, axis=2)
-    row_has_border = np.any(match, axis=1)
-
-    runs = []
-    in_run = False
-    run_start = 0
-    for r in range(len(row_has_border)):
-        if row_has_border[r] and not in_run:
-            run_start = r
-            in_run = True
-        elif not row_has_border[r] and in_run:
-            runs.append((run_start, r))
-            in_run = False
-    if in_run:
-        runs.append((run_start, len(row_has_border)))
+    row_has_border = borders.rows_with_color(img, BORDER_RGB, BORDER_TOL, columns=slice(0, 3))
+    runs = borders.runs(row_has_border)
 
     entries = [(s, e) for s, e in runs if (e - s) >= MIN_ENTRY_HEIGHT]
     return len(entries), entries, runs
@@ -68,9 +56,7 @@ def count_visible_trains(img):
 
 def frames_match(a, b, threshold=5.0):
     """Check if two frames are nearly identical."""
-    if a.shape != b.shape:
-        return False
-    return np.mean(np.abs(a.astype(float) - b.astype(float))) < threshold
+    return frame_compare.compare(a, b, threshold).same
 
 
 def scroll_train_box(amount=SCROLL_PER_TRAIN):
@@ -0,0 +1,170 @@
+"""Train-list index, persisted per route and class.
+
+The first time a class's train list is needed, it is scrolled through
+once with measured scrolls and stitched, and every train box is
+segmented by its #dedede left border. The stitched strip and each
+train's offset are saved under state/train_lists/, so later runs only
+jump to the end of the list to check it still ends there, and selecting
+a train is a single verified jump to its offset.
+
+    state/train_lists/<route>__<class>/strip.png
+    state/train_lists/<route>__<class>/index.json   {"trains": [[top, height], ...]}
+"""
+import collections
+import json
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import borders
+import capture
+import config
+import frame_compare
+import scroll_calibration
+from service_index import fingerprint
+
+# number: 1-based position in the list; top: offset of the box's top edge
+# in pixels from the top of the list (scroll position 0); crop: RGB image
+TrainEntry = collections.namedtuple("TrainEntry", "number top height crop fingerprint")
+
+# (strip, entries) loaded or built this run, by (route, class)
+_indexes = {}
+
+
+def _folder(route, train_class):
+    safe = re.sub(r"[^\w.-]+", "_", f"{route}__{train_class}")
+    return os.path.join(config.TRAIN_INDEX_DIR, safe)
+
+
+def _segment_trains(strip):
+    """Return (top, bottom) row ranges of the train boxes in a stitched strip."""
+    return borders.segment(strip, config.TRAIN_BORDER_RGB, config.TRAIN_BORDER_TOLERANCE,
+                           columns=slice(0, 3), min_length=config.TRAIN_MIN_ENTRY_HEIGHT)
+
+
+def _entries(strip, boxes):
+    return [TrainEntry(number, top, bottom - top, strip[top:bottom].copy(),
+                       fingerprint(strip[top:bottom]))
+            for number, (top, bottom) in enumerate(boxes, 1)]
+
+
+def _save(route, train_class, strip, entries):
+    folder = _folder(route, train_class)
+    os.makedirs(folder, exist_ok=True)
+    Image.fromarray(strip).save(os.path.join(folder, "strip.png"))
+    with open(os.path.join(folder, "index.json"), "w") as f:
+        json.dump({"route": route, "class": train_class,
+                   "trains": [[e.top, e.height] for e in entries]}, f, indent=2)
+
+
+def _load(route, train_class):
+    """Return (strip, entries) from disk, or None if there is no usable index."""
+    folder = _folder(route, train_class)
+    try:
+        strip = np.array(Image.open(os.path.join(folder, "strip.png")).convert("RGB"))
+        with open(os.path.join(folder, "index.json")) as f:
+            trains = json.load(f)["trains"]
+    except (OSError, ValueError, KeyError):
+        return None
+    return strip, _entries(strip, [(top, top + height) for top, height in trains])
+
+
+def _matches_screen(tracker, entries):
+    """True if the train list on screen is where the remembered strip says it should be.
+
+    The remembered boxes must be found at the tracked position, and every
+    whole train box on screen must match the fingerprint of the entry
+    indexed at its offset.
+    """
+    img = capture.get_region(tracker.region, since=time.time())
+    found = tracker.locate(cv2.cvtColor(img, cv2.COLOR_RGB2GRAY), tracker.position)
+    if found is None or abs(found - tracker.position) > config.SCROLL_TOLERANCE:
+        return False
+    checked = 0
+    for top, bottom in _segment_trains(img):
+        if top == 0 or bottom == img.shape[0]:
+            continue   # cut off by the edge of the list
+        offset = tracker.position + top
+        entry = next((e for e in entries
+                      if abs(e.top - offset) <= config.SCROLL_TOLERANCE), None)
+        if entry is None or not frame_compare.compare(
+                fingerprint(img[top:bottom]), entry.fingerprint,
+                config.SERVICE_FINGERPRINT_MAX_DIFF).same:
+            return False
+        checked += 1
+    return checked > 0
+
+
+def _ends_where_saved(tracker, strip, entries):
+    """True if the list on screen still ends where the remembered strip does.
+
+    Jumps to the strip's last page, checks the boxes there, and checks
+    that the list won't scroll any further. Leaves the list at its top.
+    """
+    last = max(0, strip.shape[0] - tracker.region[3])
+    try:
+        if abs(tracker.jump_to(last) - last) > config.SCROLL_TOLERANCE:
+            return False
+        if not _matches_screen(tracker, entries):
+            return False
+        moved = tracker.scroll_by(tracker.page_step, learn=False, assume=False)
+        return moved is not None and abs(moved) <= config.SCROLL_TOLERANCE
+    finally:
+        tracker.to_top()
+
+
+def build(route, train_class):
+    """Scroll the whole train list once and index it. Leaves the list at its top.
+
+    Returns (strip, entries).
+    """
+    print("       Indexing train list...")
+    tracker = scroll_calibration.train_list
+    tracker.to_top()
+    strip, _ = tracker.stitch_to_end()
+    entries = _entries(strip, _segment_trains(strip))
+    tracker.to_top()
+    _save(route, train_class, strip, entries)
+    print(f"       Indexed {len(entries)} trains ({strip.shape[0]}px of list)")
+    return strip, entries
+
+
+def get(route=None, train_class=None):
+    """Return the train list index for a route/class, as a list of TrainEntry.
+
+    Loaded from disk when a saved index still matches the list on screen,
+    at its top and at its end, otherwise built (which scrolls through the
+    list once). Expects the train list to be showing.
+    """
+    route = route or config.ROUTE_NAME
+    train_class = train_class or config.TRAIN_CLASS
+    key = (route, train_class)
+    tracker = scroll_calibration.train_list
+
+    if key in _indexes:
+        strip, entries = _indexes[key]
+        if tracker.key != key:
+            tracker.reset(tracker.position, key=key)
+            tracker.remember_strip(strip)
+        return entries
+
+    tracker.reset(tracker.position, key=key)
+    loaded = _load(route, train_class)
+    if loaded is not None:
+        strip, entries = loaded
+        tracker.remember_strip(strip)
+        if (_matches_screen(tracker, entries)
+                and _ends_where_saved(tracker, strip, entries)):
+            print(f"       Loaded train list index: {len(entries)} trains")
+            _indexes[key] = (strip, entries)
+            return entries
+        print("       Saved train list doesn't match the screen — re-indexing")
+        tracker.landmarks.clear()
+
+    strip, entries = build(route, train_class)
+    _indexes[key] = (strip, entries)
+    return entries
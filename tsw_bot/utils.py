@@ -1,114 +1,329 @@
+import collections
 import os
 import time
+
 import cv2
 import numpy as np
-import pyautogui
-from PIL import Image
 
+import capture
 import config
+import matching
+import wait_scheduler
+import watchdog
+
+
+def _variants(image_path):
+    """Normalise a reference path, or a list of variant paths for one element, to a list."""
+    if isinstance(image_path, str):
+        return [image_path]
+    return list(image_path)
+
+
+def _describe(image_path):
+    return "/".join(os.path.basename(ref) for ref in _variants(image_path))
+
+
+# Frames evaluated vs. skipped by change-gated wait loops, across the run
+_gate_stats = collections.Counter()
+
+
+class ChangeGate:
+    """Skip matching on frames that look the same as the last evaluated one.
+
+    A static screen gives the same match result every time, so a wait loop
+    only needs to re-run template matching once the frame signature changes.
+    """
+
+    def __init__(self):
+        self._last = None
+        self.evaluated = 0
+        self.skipped = 0
+
+    def changed(self, frame):
+        """Return True if `frame` should be evaluated (it differs from the last one that was)."""
+        signature = capture.frame_signature(frame)
+        if not capture.signatures_differ(signature, self._last):
+            self.skipped += 1
+            _gate_stats["skipped"] += 1
+            return False
+        self._last = signature
+        self.evaluated += 1
+        _gate_stats["evaluated"] += 1
+        return True
+
+
+def gate_stats():
+    """Return how many frames wait loops evaluated and skipped as unchanged."""
+    return {"evaluated": _gate_stats["evaluated"], "skipped": _gate_stats["skipped"]}
+
+
+def region_signature(region=None, step=config.CHANGE_GATE_STEP):
+    """Capture a fresh signature of a screen region (or the whole screen)."""
+    if region is None:
+        frame, _ = capture.get_frame(since=time.time())
+    else:
+        frame = capture.grab_region(region)
+    return capture.frame_signature(frame, step=step)
 
 
-def _get_best_confidence(image_path):
-    """Take a screenshot and check the best match confidence for a reference image."""
-    screenshot = pyautogui.screenshot()
-    screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
-    needle = cv2.imread(image_path)
-    if needle is None:
-        return 0.0
-    result = cv2.matchTemplate(screenshot_cv, needle, cv2.TM_CCOEFF_NORMED)
-    return result.max()
+def wait_until_stable(region=None, ceiling=config.CLICK_SETTLE_DELAY, baseline=None,
+                      frames=config.SETTLE_FRAMES, interval=config.SETTLE_INTERVAL):
+    """Wait until a screen region (or the whole screen) stops changing.
 
+    Returns as soon as `frames` consecutive captures look the same, or after
+    `ceiling` seconds. If `baseline` (a region_signature taken before the
+    action) is given, the region must first change from it, so a UI that
+    hasn't started reacting yet isn't mistaken for a settled one.
 
-def wait_for_image(image_path, timeout=60, confidence=0.8, interval=1.0):
-    """Poll the screen for an image. Returns the location when found, or None on timeout."""
-    name = os.path.basename(image_path)
+    Returns the number of seconds waited.
+    """
+    start = time.time()
+    changed = baseline is None
+    last = None
+    same = 0
+    while time.time() - start < ceiling:
+        signature = region_signature(region)
+        if not changed:
+            changed = capture.signatures_differ(signature, baseline)
+        if capture.signatures_differ(signature, last):
+            same = 1
+        else:
+            same += 1
+        last = signature
+        if changed and same >= frames:
+            break
+        time.sleep(interval)
+    return time.time() - start
+
+
+def _get_best_confidence(image_path, frame=None, mode="full"):
+    """Check the best match confidence for a reference image (or its variants) on screen."""
+    if frame is None:
+        frame, _ = capture.get_frame()
+    return max(matching.match(ref, frame, mode=mode)[0] for ref in _variants(image_path))
+
+
+def wait_for_screen(candidates, timeout=60, confidence=0.8, interval=1.0,
+                    mode=config.MATCH_MODE, adaptive=True):
+    """Poll the screen until one of several screens shows.
+
+    `candidates` maps a screen state to its reference variants (see
+    matching.classify); every variant is scored against the same frame,
+    using coarse-to-fine matching by default (see config.MATCH_MODE).
+    Matching is skipped on frames that haven't changed since the last check.
+    With adaptive=True the poll interval comes from this screen's wait
+    history (see wait_scheduler); `interval` is then the fallback, and the
+    wait still runs to `timeout` when the screen is later than its history
+    expects.
+    Returns the ScreenMatch when found, or None on timeout.
+    """
+    name = ", ".join(_describe(refs) for refs in candidates.values())
+    all_refs = [ref for refs in candidates.values() for ref in refs]
+    plan = wait_scheduler.plan(name, timeout, interval) if adaptive else None
+    gate = ChangeGate()
+    best = 0.0
+    best_stale = True  # a new frame was evaluated since `best` was computed
     start = time.time()
     attempts = 0
     while time.time() - start < timeout:
-        try:
-            location = pyautogui.locateOnScreen(image_path, confidence=confidence)
-            if location is not None:
-                return location
-        except pyautogui.ImageNotFoundException:
-            pass
+        watchdog.check()
+        if plan is not None:
+            plan.check_overdue(time.time() - start)
+        frame, _ = capture.get_frame()
+        if gate.changed(frame):
+            hit = matching.classify(candidates, frame, confidence=confidence, mode=mode)
+            if hit is not None:
+                if plan is not None:
+                    plan.done(time.time() - start)
+                return hit
+            best_stale = True
         attempts += 1
         if attempts % 5 == 0:
-            best = _get_best_confidence(image_path)
+            if best_stale:
+                best = _get_best_confidence(all_refs, frame, mode=mode)
+                best_stale = False
             elapsed = int(time.time() - start)
-            print(f"       ... still looking for '{name}' (best confidence: {best:.3f}, need: {confidence}, {elapsed}s elapsed)")
-        time.sleep(interval)
+            print(f"       ... still looking for '{name}' (best confidence: {best:.3f}, need: {confidence}, "
+                  f"{elapsed}s elapsed, {gate.skipped} unchanged frames skipped)")
+        time.sleep(interval if plan is None else plan.next_interval(time.time() - start))
+    if plan is not None:
+        plan.expired(time.time() - start)
     # Final debug info on timeout
-    best = _get_best_confidence(image_path)
-    print(f"       TIMEOUT: '{name}' best confidence was {best:.3f}, needed {confidence}")
+    best = _get_best_confidence(all_refs, mode=mode)
+    print(f"       TIMEOUT: '{name}' best confidence was {best:.3f}, needed {confidence} "
+          f"({gate.evaluated} frames checked, {gate.skipped} unchanged frames skipped)")
     return None
 
 
-def _screen_changed(image_path, confidence, wait_time, check_interval=2.0):
-    """Wait up to wait_time seconds for an image to disappear from screen.
+def wait_for_image(image_path, timeout=60, confidence=0.8, interval=1.0,
+                   mode=config.MATCH_MODE, adaptive=True):
+    """Poll the screen for an image. Returns the location when found, or None on timeout.
 
-    Returns True if the image disappeared (screen changed), False if still visible.
+    `image_path` may be a list of variant images of the same element; the
+    first variant found wins.
     """
-    start = time.time()
-    while time.time() - start < wait_time:
-        time.sleep(check_interval)
-        try:
-            loc = pyautogui.locateOnScreen(image_path, confidence=confidence)
-        except pyautogui.ImageNotFoundException:
-            loc = None
-        if loc is None:
-            return True
-    return False
+    hit = wait_for_screen({_describe(image_path): _variants(image_path)},
+                          timeout=timeout, confidence=confidence, interval=interval,
+                          mode=mode, adaptive=adaptive)
+    return None if hit is None else hit.box
 
 
-def wait_and_click(image_path, timeout=60, confidence=0.8, interval=1.0, click_duration=0.2,
-                   verify=True):
-    """Wait for an image to appear on screen, then click its center.
+def _padded_region(box, padding):
+    """Grow a Box by `padding` pixels on each side, clipped at the screen origin."""
+    left = max(0, box.left - padding)
+    top = max(0, box.top - padding)
+    return (left, top, box.left + box.width + padding - left, box.top + box.height + padding - top)
 
-    If verify=True, checks that the clicked image disappeared (screen changed).
-    If the screen hasn't changed after RETRY_WAIT seconds, clicks again.
-    Tries up to RETRY_MAX times before giving up.
 
-    Set verify=False for elements that stay on screen after clicking (e.g. text fields).
+def _outside_signature(frame, region, step=config.CHANGE_GATE_STEP):
+    """Return a frame signature with `region` blanked out."""
+    signature = capture.frame_signature(frame, step).copy()
+    left, top, width, height = region
+    signature[top // step:-(-(top + height) // step),
+              left // step:-(-(left + width) // step)] = 0
+    return signature
 
-    Returns True if clicked successfully, False if image never appeared or
-    screen never changed after all retries.
+
+def _element_shown(variants, frame, region, confidence, mode):
+    """True if any variant of an element still matches within `region` of a frame."""
+    left, top, width, height = region
+    crop = frame[top:top + height, left:left + width]
+    return any(matching.match(ref, crop, mode=mode)[0] >= confidence for ref in variants)
+
+
+def _changed_samples(a, b):
+    """Boolean grid of signature samples that differ between `a` and `b`."""
+    return cv2.absdiff(a, b).max(axis=-1) > config.CHANGE_GATE_TOLERANCE
+
+
+def _screen_reacted(signature, baseline, ambient):
+    """True if more than CLICK_ACK_MIN_CHANGE of an outside signature changed from `baseline`.
+
+    Samples in the `ambient` mask were already changing before the click
+    (an animated background) and don't count.
     """
-    location = wait_for_image(image_path, timeout=timeout, confidence=confidence, interval=interval)
-    if location is None:
-        return False
+    changed = _changed_samples(signature, baseline) & ~ambient
+    return np.count_nonzero(changed) > config.CLICK_ACK_MIN_CHANGE * changed.size
+
+
+def _click_acknowledged(variants, region, before, baseline, ambient, confidence, mode,
+                        timeout=config.CLICK_ACK_TIMEOUT):
+    """Watch the screen after a click until the game visibly reacts to it.
+
+    Every check reads a freshly grabbed frame. The element disappearing
+    from `region` counts as a reaction, as does the screen outside it
+    differing from `baseline` (an _outside_signature) in two consecutive
+    frames, ignoring the `ambient` samples that were animating before the
+    click. Changes within the region don't: a hover highlight or the
+    cursor repaints it as well. `before` is the pre-click frame; the
+    element is only looked for again once the frame differs from it.
+    """
+    last = capture.frame_signature(before)
+    reacted = False
+    start = time.time()
+    while time.time() - start < timeout:
+        frame, _ = capture.get_frame(since=time.time())
+        if _screen_reacted(_outside_signature(frame, region), baseline, ambient):
+            if reacted:
+                return True
+            reacted = True
+        else:
+            reacted = False
+        signature = capture.frame_signature(frame)
+        if capture.signatures_differ(signature, last):
+            last = signature
+            if not _element_shown(variants, frame, region, confidence, mode):
+                return True
+        time.sleep(config.CLICK_ACK_INTERVAL)
+    return False
+
+
+def click_and_confirm(image_path, location, confidence=0.8, click_duration=0.2,
+                      mode=config.MATCH_MODE):
+    """Click a located element and retry quickly until the game reacts.
 
-    name = os.path.basename(image_path)
+    After each click the screen is watched at high frequency; the element
+    disappearing, or a lasting change elsewhere on screen, within
+    CLICK_ACK_TIMEOUT confirms the click (see _click_acknowledged). With no
+    reaction, the screen is given up to CLICK_SETTLE_DELAY to settle, in
+    case the game is just slow, and checked again: if it has changed or the
+    element is gone the click still landed, otherwise the element is
+    clicked again, up to RETRY_MAX times.
+
+    Returns True if the click was acknowledged, False after all retries.
+    """
+    import pyautogui  # imported lazily so the matching helpers load without a display
+    name = _describe(image_path)
+    variants = _variants(image_path)
 
     for attempt in range(1, config.RETRY_MAX + 1):
         center = pyautogui.center(location)
-        # Move mouse to target first, pause, then click — some game UIs need this
+        region = _padded_region(location, config.CLICK_ACK_PADDING)
+        # Move mouse to target first, pause, then click — some game UIs need this.
+        # The baseline is taken after the pause so hover highlights don't count,
+        # and from two grabs so parts of the screen that animate on their own don't either.
         pyautogui.moveTo(center)
         time.sleep(0.5)
+        first, _ = capture.get_frame(since=time.time())
+        before, _ = capture.get_frame(since=time.time())
+        baseline = _outside_signature(before, region)
+        ambient = _changed_samples(_outside_signature(first, region), baseline)
         pyautogui.mouseDown()
         time.sleep(click_duration)
         pyautogui.mouseUp()
 
-        if not verify:
+        if _click_acknowledged(variants, region, before, baseline, ambient, confidence, mode):
             return True
 
-        # Check if the screen changed (clicked image should disappear)
-        if _screen_changed(image_path, confidence, wait_time=config.RETRY_WAIT):
-            return True
+        # No reaction yet — let a slow transition finish before deciding to click again
+        wait_until_stable(ceiling=config.CLICK_SETTLE_DELAY)
+        frame, _ = capture.get_frame(since=time.time())
+        if _screen_reacted(_outside_signature(frame, region), baseline, ambient):
+            return True  # The game reacted, just after the watch ended
+        hit = matching.classify({name: variants}, frame, confidence=confidence, mode=mode)
+        if hit is None:
+            return True  # Image disappeared without a visible reaction while watched
+        location = hit.box
 
-        # Screen hasn't changed — click didn't register
         if attempt < config.RETRY_MAX:
-            print(f"       Screen hasn't changed after clicking '{name}' "
+            print(f"       No reaction after clicking '{name}' "
                   f"(attempt {attempt}/{config.RETRY_MAX}), clicking again...")
-            # Re-locate the image in case it shifted
-            try:
-                new_loc = pyautogui.locateOnScreen(image_path, confidence=confidence)
-                if new_loc is not None:
-                    location = new_loc
-            except pyautogui.ImageNotFoundException:
-                return True  # Image disappeared between checks
         else:
             print(f"       WARNING: '{name}' still visible after "
                   f"{config.RETRY_MAX} attempts — giving up")
-            return False
 
     return False
+
+
+def wait_and_click(image_path, timeout=60, confidence=0.8, interval=1.0, click_duration=0.2,
+                   verify=True, mode=config.MATCH_MODE):
+    """Wait for an image to appear on screen, then click its center.
+
+    If verify=True, confirms the game reacted to the click (see
+    click_and_confirm) and clicks again quickly if it didn't, up to
+    RETRY_MAX times.
+
+    Set verify=False for elements that stay on screen after clicking (e.g. text fields).
+    `image_path` may be a list of variant images of the same element.
+
+    Returns True if clicked successfully, False if image never appeared or
+    the game never reacted after all retries.
+    """
+    import pyautogui
+    location = wait_for_image(image_path, timeout=timeout, confidence=confidence,
+                              interval=interval, mode=mode)
+    if location is None:
+        return False
+
+    if verify:
+        return click_and_confirm(image_path, location, confidence=confidence,
+                                 click_duration=click_duration, mode=mode)
+
+    center = pyautogui.center(location)
+    # Move mouse to target first, pause, then click — some game UIs need this
+    pyautogui.moveTo(center)
+    time.sleep(0.5)
+    pyautogui.mouseDown()
+    time.sleep(click_duration)
+    pyautogui.mouseUp()
+    return True
@@ -0,0 +1,138 @@
+"""History-driven scheduling for screen waits.
+
+Records how long each wait actually took, per route and screen, and uses
+that history to poll sparsely while the screen can't be there yet, densely
+around its expected arrival, and to derive timeouts from observed
+percentiles instead of fixed worst-case constants.
+
+History is kept in state/wait_history.json:
+    {"<route>|<screen>": [seconds, ...]}   (newest WAIT_HISTORY_SIZE kept)
+and written every WAIT_HISTORY_FLUSH_EVERY recorded waits and at exit.
+"""
+import atexit
+import json
+import os
+
+import numpy as np
+
+import config
+
+_history = None
+_route = None
+_unsaved = 0   # waits recorded since the history was last written
+
+
+def set_route(route_name):
+    """Set the route that new waits are recorded under."""
+    global _route
+    _route = route_name
+
+
+def _key(screen):
+    return f"{_route or config.ROUTE_NAME}|{screen}"
+
+
+def _load():
+    global _history
+    if _history is None:
+        _history = {}
+        if os.path.isfile(config.WAIT_HISTORY_PATH):
+            try:
+                with open(config.WAIT_HISTORY_PATH) as f:
+                    _history = json.load(f)
+            except (OSError, ValueError):
+                print("       WARNING: Ignoring unreadable wait history")
+    return _history
+
+
+def _save():
+    os.makedirs(os.path.dirname(config.WAIT_HISTORY_PATH), exist_ok=True)
+    with open(config.WAIT_HISTORY_PATH, "w") as f:
+        json.dump(_history, f, indent=1)
+
+
+def flush():
+    """Write any recorded waits that haven't been saved yet."""
+    global _unsaved
+    if _unsaved:
+        _save()
+        _unsaved = 0
+
+
+atexit.register(flush)
+
+
+def record(screen, seconds):
+    """Record how long a wait for `screen` took (or, for a timeout, at least took)."""
+    global _unsaved
+    samples = _load().setdefault(_key(screen), [])
+    samples.append(round(seconds, 2))
+    del samples[:-config.WAIT_HISTORY_SIZE]
+    _unsaved += 1
+    if _unsaved >= config.WAIT_HISTORY_FLUSH_EVERY:
+        flush()
+
+
+class WaitPlan:
+    """Poll intervals and timeout for one wait, derived from its history.
+
+    With fewer than WAIT_MIN_SAMPLES recorded waits, the caller's defaults
+    are used unchanged. Otherwise `timeout` is when the screen is overdue;
+    the wait still goes on up to the caller's timeout (`ceiling`) before
+    failing, so one slow occurrence doesn't end the run.
+    """
+
+    def __init__(self, screen, default_timeout, default_interval):
+        self.screen = screen
+        self.default_interval = default_interval
+        self.ceiling = default_timeout
+        self.timeout = default_timeout
+        self.expected = None
+        self.early = None
+        self.late = None
+        self._warned = False
+
+        samples = _load().get(_key(screen), [])
+        if len(samples) >= config.WAIT_MIN_SAMPLES:
+            self.expected = float(np.percentile(samples, 50))
+            self.early = float(np.percentile(samples, 5)) * 0.8
+            self.late = float(np.percentile(samples, 95))
+            derived = self.late * config.WAIT_TIMEOUT_FACTOR + config.WAIT_TIMEOUT_SLACK
+            self.timeout = min(default_timeout, max(config.WAIT_MIN_TIMEOUT, derived))
+
+    def next_interval(self, elapsed):
+        """Seconds to sleep before the next poll, `elapsed` seconds into the wait."""
+        if self.expected is None:
+            return self.default_interval
+        if elapsed < self.early:
+            # Too early for the screen to be there: poll sparsely, but wake
+            # up in time for the dense window
+            return max(config.WAIT_MIN_INTERVAL,
+                       min(config.WAIT_MAX_INTERVAL, self.early - elapsed))
+        if elapsed < self.late:
+            return config.WAIT_MIN_INTERVAL
+        return self.default_interval
+
+    def check_overdue(self, elapsed):
+        """Warn once when the wait runs past its history-derived timeout."""
+        if not self._warned and self.timeout < elapsed < self.ceiling:
+            self._warned = True
+            print(f"       '{self.screen}' is taking longer than usual "
+                  f"(expected within {self.timeout:.0f}s), waiting up to {self.ceiling:.0f}s")
+
+    def done(self, elapsed):
+        """Record a successful wait."""
+        record(self.screen, elapsed)
+
+    def expired(self, elapsed):
+        """Record a wait that timed out after `elapsed` seconds.
+
+        The screen took at least that long, so it is recorded as a sample
+        at that ceiling; otherwise a fast history would never widen again.
+        """
+        record(self.screen, elapsed)
+
+
+def plan(screen, default_timeout, default_interval=1.0):
+    """Return a WaitPlan for a wait on `screen`."""
+    return WaitPlan(screen, default_timeout, default_interval)
@@ -0,0 +1,106 @@
+"""Stuck-state detection and recovery.
+
+A crawl is a long chain of waits, and any one of them can time out on a
+missed tile or an unexpected dialog. Instead of letting that end the run,
+each unit of work (indexing a train, capturing one service) runs under
+run_with_recovery(). If it times out or stalls, the game is brought back
+to a screen the navigator recognises, by the cheapest means that works:
+
+    1. identify   the screen is recognised as it is
+    2. escape     press Escape (up to WATCHDOG_ESCAPES times) until it is
+    3. relaunch   kill the game; the navigator launches it again
+
+and the work is retried. Its first step is a nav.go_to, so the navigator
+plans the way back (e.g. to the failed service's offset in the list).
+
+Waits call check() as they poll, so a run that makes no progress for
+WATCHDOG_STALL_SECONDS raises Stalled even if every single wait is
+within its own timeout.
+"""
+import collections
+import subprocess
+import time
+
+import config
+import health
+
+_last_progress = time.time()
+
+# How many recoveries used each rung of the ladder
+recoveries = collections.Counter()
+
+
+class Stalled(TimeoutError):
+    """No progress has been made for WATCHDOG_STALL_SECONDS."""
+
+
+def progress():
+    """Note that the run has moved forward."""
+    global _last_progress
+    _last_progress = time.time()
+
+
+def check():
+    """Raise Stalled if nothing has marked progress for too long."""
+    stalled = time.time() - _last_progress
+    if stalled > config.WATCHDOG_STALL_SECONDS:
+        raise Stalled(f"No progress for {stalled:.0f}s")
+
+
+def _kill_game():
+    """Force the game process to close and wait for it to go."""
+    subprocess.run(["taskkill", "/F", "/IM", config.GAME_PROCESS_NAME],
+                   capture_output=True)
+    deadline = time.time() + 30
+    while health.monitor.source.rss() is not None and time.time() < deadline:
+        time.sleep(1)
+    time.sleep(5)   # let Steam notice the game has gone
+
+
+def recover():
+    """Get the game onto a screen the navigator recognises.
+
+    Returns the rung that worked: "identify", "escape" or "relaunch".
+    """
+    import pyautogui  # imported lazily so this module loads without a display
+    # navigator imports utils, which imports this module
+    from navigator import NOT_RUNNING, nav
+    from utils import region_signature, wait_until_stable
+
+    progress()
+    if nav.identify() is not None:
+        return "identify"
+
+    for attempt in range(1, config.WATCHDOG_ESCAPES + 1):
+        print(f"       Pressing Escape to recover ({attempt}/{config.WATCHDOG_ESCAPES})...")
+        baseline = region_signature()
+        pyautogui.press("escape")
+        wait_until_stable(ceiling=3.0, baseline=baseline)
+        if nav.identify() is not None:
+            return "escape"
+
+    print("       Screen still not recognised — closing the game to relaunch it")
+    _kill_game()
+    nav.mark(NOT_RUNNING)
+    return "relaunch"
+
+
+def run_with_recovery(label, action, attempts=None):
+    """Run `action()`, recovering and retrying it if it times out or stalls.
+
+    Returns what `action` returns. The last TimeoutError is re-raised once
+    `attempts` (default WATCHDOG_ATTEMPTS) runs have failed.
+    """
+    attempts = attempts or config.WATCHDOG_ATTEMPTS
+    for attempt in range(1, attempts + 1):
+        progress()
+        try:
+            return action()
+        except TimeoutError as e:
+            if attempt == attempts:
+                raise
+            print(f"\n       STUCK during {label}: {e}")
+            rung = recover()
+            recoveries[rung] += 1
+            print(f"       Recovered ({rung}) — retrying {label} "
+                  f"(attempt {attempt + 1}/{attempts})")